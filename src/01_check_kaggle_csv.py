@@ -1,10 +1,100 @@
+import argparse
+import sys
+
+import numpy as np
 import pandas as pd
 
-df = pd.read_csv("data/raw/llm_comparison_dataset.csv")
-print("CSV READ OK")
+from schema import NUM_COLS, RENAME_MAP
+from sketches import HyperLogLog
+
+IN_PATH = "data/raw/llm_comparison_dataset.csv"
+
+CHUNKSIZE = 100_000
+SAMPLE_ROWS = 1000
+
+
+def check_header(path: str, sample_rows: int = SAMPLE_ROWS) -> tuple[list[str], list[str], pd.DataFrame]:
+    sample = pd.read_csv(path, nrows=sample_rows, dtype=str)
+    expected = list(RENAME_MAP.keys())
+    missing = [c for c in expected if c not in sample.columns]
+    unexpected = [c for c in sample.columns if c not in RENAME_MAP]
+    return missing, unexpected, sample
+
+
+def profile_csv(path: str, chunksize: int = CHUNKSIZE) -> tuple[int, pd.DataFrame]:
+    header = pd.read_csv(path, nrows=0).columns
+    numeric_raw = {raw for raw, col in RENAME_MAP.items() if col in NUM_COLS}
+    # numeričke stupce parsira C parser; tek chunk s neispravnom vrijednošću ostaje object i ide kroz to_numeric
+    text_dtypes = {c: str for c in header if c not in numeric_raw}
+    stats = {}
+    n_rows = 0
+
+    for chunk in pd.read_csv(path, dtype=text_dtypes, chunksize=chunksize, low_memory=False):
+        n_rows += len(chunk)
+        for c in chunk.columns:
+            st = stats.setdefault(c, {"nulls": 0, "parse_failures": 0, "min": np.nan, "max": np.nan, "hll": HyperLogLog()})
+            s = chunk[c]
+            present = s.notna()
+            st["nulls"] += int((~present).sum())
+            if c not in numeric_raw:
+                st["hll"].add(s[present])
+                continue
+
+            num = s if pd.api.types.is_numeric_dtype(s) else pd.to_numeric(s, errors="coerce")
+            st["parse_failures"] += int((present & num.isna()).sum())
+            num = num.dropna().astype("float64")
+            if len(num):
+                st["hll"].add_hashes(pd.util.hash_array(num.to_numpy()))
+                st["min"] = num.min() if np.isnan(st["min"]) else min(st["min"], num.min())
+                st["max"] = num.max() if np.isnan(st["max"]) else max(st["max"], num.max())
+
+    rows = []
+    for c, st in stats.items():
+        rows.append({
+            "column": c,
+            "nulls": st["nulls"],
+            "parse_failures": st["parse_failures"] if c in numeric_raw else None,
+            "min": st["min"],
+            "max": st["max"],
+            "approx_distinct": st["hll"].count(),
+        })
+    return n_rows, pd.DataFrame(rows)
+
+
+def count_rows(path: str, chunksize: int = CHUNKSIZE) -> int:
+    return sum(len(chunk) for chunk in pd.read_csv(path, dtype=str, usecols=[0], chunksize=chunksize))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Provjera ulaznog Kaggle CSV-a.")
+    ap.add_argument("--path", default=IN_PATH)
+    ap.add_argument("--profile", action="store_true",
+                    help="provjeri stupce iz uzorka, a zatim jednim prolazom izračunaj profil stupaca")
+    ap.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = ap.parse_args()
+
+    missing, unexpected, sample = check_header(args.path)
+    print("CSV READ OK")
+
+    if not args.profile:
+        print((count_rows(args.path, args.chunksize), len(sample.columns)))
+        print(sample.columns.tolist())
+        print(pd.read_csv(args.path, nrows=50).to_string(index=False))
+        return
+
+    if unexpected:
+        print("Neočekivani stupci:", unexpected)
+    if missing:
+        print("Nedostaju očekivani stupci:", missing)
+        sys.exit(1)
+
+    n_rows, prof = profile_csv(args.path, args.chunksize)
+    print((n_rows, len(prof)))
+    print(prof.to_string(index=False))
 
-print(df.shape)
-print(df.columns.tolist())
-print(df.head(50).to_string(index=False))
+    if (prof["parse_failures"].fillna(0) > 0).any():
+        print("Upozorenje: neke numeričke vrijednosti nisu parsabilne i bit će NaN nakon čišćenja.")
 
 
+if __name__ == "__main__":
+    main()
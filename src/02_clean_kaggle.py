@@ -1,43 +1,125 @@
+import argparse
 import os
+from typing import Optional
+
 import pandas as pd
 
+from columnar import ColumnarWriter, cols_path
+from schema import CLEAN_DTYPES, FLAG_COLS, NUM_COLS, RAW_DTYPES, RENAME_MAP, compact_frame
+
 IN_PATH = "data/raw/llm_comparison_dataset.csv"
 OUT_PATH = "data/processed/kaggle_clean.csv"
 
-df = pd.read_csv(IN_PATH)
-
-# stabilan ID izvornog retka
-df.insert(0, "kaggle_row_id", range(len(df)))
-
-df = df.rename(columns={
-    "Model": "model_name",
-    "Provider": "provider",
-    "Context Window": "context_window",
-    "Speed (tokens/sec)": "speed_tokens_per_sec",
-    "Latency (sec)": "latency_sec",
-    "Benchmark (MMLU)": "benchmark_mmlu",
-    "Benchmark (Chatbot Arena)": "benchmark_chatbot_arena",
-    "Open-Source": "open_source",
-    "Price / Million Tokens": "price_per_million_tokens",
-    "Training Dataset Size": "training_dataset_size",
-    "Compute Power": "compute_power",
-    "Energy Efficiency": "energy_efficiency",
-    "Quality Rating": "quality_rating",
-    "Speed Rating": "speed_rating",
-    "Price Rating": "price_rating",
-})
-
-num_cols = [
-    "context_window", "speed_tokens_per_sec", "latency_sec",
-    "benchmark_mmlu", "benchmark_chatbot_arena",
-    "price_per_million_tokens", "training_dataset_size",
-    "compute_power", "energy_efficiency",
-    "quality_rating", "speed_rating", "price_rating",
-]
-for c in num_cols:
-    if c in df.columns:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-
-os.makedirs("data/processed", exist_ok=True)
-df.to_csv(OUT_PATH, index=False, encoding="utf-8-sig")
-print("Saved:", OUT_PATH, "rows=", len(df))
+CHUNKSIZE = 100_000
+
+
+def clean_chunk(df: pd.DataFrame, start_id: int = 0, float_cols: Optional[set[str]] = None) -> pd.DataFrame:
+    df = df.copy()
+
+    # stabilan ID izvornog retka, globalno jedinstven i kad se čita po chunkovima
+    df.insert(0, "kaggle_row_id", range(start_id, start_id + len(df)))
+
+    df = df.rename(columns=RENAME_MAP)
+
+    for c in NUM_COLS + FLAG_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return compact_frame(apply_schema(df, float_cols))
+
+
+def _fractional(s: pd.Series) -> bool:
+    return bool((s.dropna() % 1 != 0).any())
+
+
+def fractional_columns(in_path: str, chunksize: int = CHUNKSIZE) -> set[str]:
+    # Int64 stupci s ijednom necijelom vrijednošću u cijeloj datoteci; tip se odlučuje jednom za sve
+    # chunkove, inače bi isti stupac u CSV-u bio dijelom 256000, a dijelom 256000.0
+    int_cols = {raw: col for raw, col in RENAME_MAP.items() if CLEAN_DTYPES.get(col) == "Int64"}
+    usecols = [raw for raw in pd.read_csv(in_path, nrows=0).columns if raw in int_cols]
+    found: set[str] = set()
+    if not usecols:
+        return found
+    for chunk in pd.read_csv(in_path, dtype=RAW_DTYPES, usecols=usecols, chunksize=chunksize):
+        for raw in usecols:
+            if int_cols[raw] not in found and _fractional(pd.to_numeric(chunk[raw], errors="coerce")):
+                found.add(int_cols[raw])
+    return found
+
+
+def apply_schema(df: pd.DataFrame, float_cols: Optional[set[str]] = None) -> pd.DataFrame:
+    # float_cols iz fractional_columns za čitanje po chunkovima; None znači da je df cijela datoteka
+    for c, dtype in CLEAN_DTYPES.items():
+        if c not in df.columns:
+            continue
+        if dtype == "Int64":
+            # necijele vrijednosti u cjelobrojnom stupcu ne smiju se tiho odrezati
+            fractional = _fractional(df[c]) if float_cols is None else c in float_cols
+            if fractional:
+                df[c] = df[c].astype("float64")
+                continue
+        df[c] = df[c].astype(dtype)
+    return df
+
+
+def clean(in_path: str = IN_PATH, chunksize: int = CHUNKSIZE) -> pd.DataFrame:
+    chunks, n_rows = [], 0
+    float_cols = fractional_columns(in_path, chunksize)
+    for chunk in pd.read_csv(in_path, dtype=RAW_DTYPES, chunksize=chunksize):
+        chunks.append(clean_chunk(chunk, start_id=n_rows, float_cols=float_cols))
+        n_rows += len(chunk)
+    if not chunks:
+        return clean_chunk(pd.read_csv(in_path, nrows=0))
+    # kategorije se razlikuju po chunkovima, pa concat daje object; compact_frame ih ponovno sažima
+    return compact_frame(pd.concat(chunks, ignore_index=True))
+
+
+def clean_csv(in_path: str, out_path: str, chunksize: int = CHUNKSIZE, csv: bool = True) -> int:
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+
+    n_rows = 0
+    mem_raw = mem_clean = 0
+    float_cols = fractional_columns(in_path, chunksize)
+    reader = pd.read_csv(in_path, dtype=RAW_DTYPES, chunksize=chunksize)
+    with ColumnarWriter(cols_path(out_path)) as cols:
+        for chunk in reader:
+            out = clean_chunk(chunk, start_id=n_rows, float_cols=float_cols)
+            mem_raw += int(chunk.memory_usage(deep=True).sum())
+            mem_clean += int(out.memory_usage(deep=True).sum())
+            cols.append(out)
+            if csv and n_rows == 0:
+                out.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+            elif csv:
+                out.to_csv(tmp_path, mode="a", header=False, index=False, encoding="utf-8")
+            n_rows += len(out)
+
+        if n_rows == 0:
+            header = clean_chunk(pd.read_csv(in_path, nrows=0))
+            cols.append(header)
+            if csv:
+                header.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+
+        # CSV izvoz se objavljuje prije binarnog međurezultata, pa binarni nikad nije stariji
+        if csv:
+            os.replace(tmp_path, out_path)
+
+    if n_rows:
+        print(f"Memory kaggle_clean (zbroj chunkova): {mem_clean / 2**20:.2f} MB "
+              f"(sirovo {mem_raw / 2**20:.2f} MB, {mem_raw / max(mem_clean, 1):.1f}x manje)")
+    return n_rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Čišćenje Kaggle CSV-a.")
+    ap.add_argument("--chunksize", type=int, default=CHUNKSIZE,
+                    help="broj redaka po chunku; vršna memorija ovisi o chunku, ne o veličini datoteke")
+    ap.add_argument("--no-csv", action="store_true",
+                    help="zapiši samo binarni stupčani međurezultat, bez CSV izvoza")
+    args = ap.parse_args()
+
+    n_rows = clean_csv(IN_PATH, OUT_PATH, chunksize=args.chunksize, csv=not args.no_csv)
+    print("Saved:", OUT_PATH, "rows=", n_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
+import argparse
 import json
 import os
-import time
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+
 import requests
 
+from columnar import read_table
+from hf_client import HF_ENDPOINT, TokenBucket, get_with_retry, make_session
+from hf_matcher import RepoMatcher, match_candidates
+from hf_snapshot import SNAPSHOT_PATH, load_snapshot
+
 KAGGLE_CLEAN = "data/processed/kaggle_clean.csv"
 OUT_JSON = "data/raw/hf_candidates_by_row.json"
+CHECKPOINT = "data/raw/hf_candidates_checkpoint.jsonl"
+
+HF_SEARCH_URL = f"{HF_ENDPOINT}/api/models"
 
-HF_SEARCH_URL = "https://huggingface.co/api/models"
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 6.0  # zahtjeva u sekundi, otprilike kao stari serijski sleep(0.15)
 
 CLOSED = {"openai", "google", "anthropic", "aws"}
 
@@ -25,7 +36,12 @@ def provider_prefixes(provider: str):
     return []
 
 
-def hf_search(query: str, limit: int = 50):
+def hf_search(
+    query: str,
+    limit: int = 50,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+):
     params = {
         "search": query,
         "limit": limit,
@@ -33,7 +49,11 @@ def hf_search(query: str, limit: int = 50):
         "direction": -1,
         "expand[]": ["downloads", "downloadsAllTime", "likes"],
     }
-    r = requests.get(HF_SEARCH_URL, params=params, timeout=60)
+    if session is None:
+        # samostalan poziv dobiva vlastitu sesiju koja se odmah zatvara
+        with make_session(1) as s:
+            return hf_search(query, limit, s, limiter)
+    r = get_with_retry(session, HF_SEARCH_URL, params=params, limiter=limiter)
     r.raise_for_status()
     return r.json()
 
@@ -58,11 +78,128 @@ def build_query(model_name: str, provider: str) -> str:
 
 
 
+def search_items(query: str, session=None, limiter=None) -> list[dict]:
+    items = hf_search(query, limit=50, session=session, limiter=limiter)
+    return [
+        {
+            "id": it.get("id"),
+            "likes": it.get("likes"),
+            "downloads": it.get("downloads"),
+            "downloadsAllTime": it.get("downloadsAllTime"),
+        }
+        for it in items
+    ]
+
+
+def filter_candidates(items: list[dict], provider: str) -> list[dict]:
+    prefixes = provider_prefixes(provider)
+    if prefixes:
+        items = [
+            it for it in items
+            if any((it.get("id") or "").startswith(pref) for pref in prefixes)
+        ]
+    return [dict(it) for it in items[:50]]
+
+
+def load_checkpoint(path: str) -> dict[str, list[dict]]:
+    memo = {}
+    if not os.path.exists(path):
+        return memo
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                # zadnji redak može biti nedovršen ako je prethodni run prekinut usred zapisa
+                continue
+            memo[rec["query"]] = rec["items"]
+    return memo
+
+
+def _end_with_newline(path: str) -> None:
+    # nedovršen zadnji redak inače bi se spojio s prvim novim zapisom
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Dohvat Hugging Face kandidata za Kaggle retke.")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                    help="broj paralelnih zahtjeva (1 = serijski)")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                    help="najviše zahtjeva u sekundi prema HF API-ju (0 = bez ograničenja)")
+    ap.add_argument("--fresh", action="store_true",
+                    help="zanemari postojeći checkpoint i kreni ispočetka")
+    ap.add_argument("--snapshot", nargs="?", const=SNAPSHOT_PATH, default=None,
+                    help="traži kandidate u lokalnom snapshotu HF kataloga umjesto preko API-ja")
+    ap.add_argument("--matcher", action="store_true",
+                    help="kandidati iz indeksiranog fuzzy matchera nad snapshotom (umjesto HF search upita)")
+    return ap.parse_args()
+
+
+def fetch_queries(queries: set[str], args) -> dict[str, list[dict]]:
+    if args.snapshot:
+        cat = load_snapshot(args.snapshot)
+        print("Queries:", len(queries), "resolved from snapshot", args.snapshot, "models=", len(cat))
+        return {q: cat.search(q, limit=50) for q in queries}
+
+    if args.fresh and os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
+    memo = load_checkpoint(CHECKPOINT)
+
+    # svaki različiti upit dohvaća se samo jednom, bez obzira na broj redaka koji ga koriste
+    pending = sorted(queries - memo.keys())
+    print("Queries:", len(queries), "from checkpoint=", len(memo), "to fetch=", len(pending))
+
+    workers = max(1, args.workers)
+    limiter = TokenBucket(args.rate)
+
+    _end_with_newline(CHECKPOINT)
+    error = None
+    # pool se ugasi prije nego što se sesija zatvori
+    with make_session(workers) as session:
+        with open(CHECKPOINT, "a", encoding="utf-8") as ckpt, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(search_items, q, session, limiter): q for q in pending}
+            for fut in as_completed(futures):
+                if fut.cancelled():
+                    continue
+                q = futures[fut]
+                try:
+                    memo[q] = fut.result()
+                except Exception as e:
+                    # upiti koji još nisu krenuli se otkazuju; oni u tijeku se dovrše i zapišu u checkpoint
+                    if error is None:
+                        error = e
+                        for f in futures:
+                            f.cancel()
+                    continue
+                ckpt.write(json.dumps({"query": q, "items": memo[q]}, ensure_ascii=False) + "\n")
+                ckpt.flush()
+    if error is not None:
+        raise error
+    return memo
+
+
 def main():
-    df = pd.read_csv(KAGGLE_CLEAN)
+    args = parse_args()
+    df = read_table(KAGGLE_CLEAN, columns=["kaggle_row_id", "model_name", "provider"])
     os.makedirs("data/raw", exist_ok=True)
 
+    if args.matcher:
+        cat = load_snapshot(args.snapshot or SNAPSHOT_PATH)
+        rows = zip(df["kaggle_row_id"], df["model_name"].astype(str), df["provider"].astype(str))
+        out = match_candidates(rows, RepoMatcher.from_catalogue(cat), cat, provider_prefixes, CLOSED)
+        with open(OUT_JSON, "w", encoding="utf-8") as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+        print("Saved:", OUT_JSON, "rows=", len(out), "(matcher)")
+        return
+
     out = {}
+    jobs = []
 
     for _, row in df.iterrows():
         row_id = int(row["kaggle_row_id"])
@@ -80,39 +217,24 @@ def main():
             }
             continue
 
-        q = build_query(model_name, provider)
-        items = hf_search(q, limit=50)
-
-        prefixes = provider_prefixes(provider)
-        if prefixes:
-            items = [
-                it for it in items
-                if any((it.get("id") or "").startswith(pref) for pref in prefixes)
-            ]
-
-        candidates = []
-        for it in items[:50]:
-            candidates.append(
-                {
-                    "id": it.get("id"),
-                    "likes": it.get("likes"),
-                    "downloads": it.get("downloads"),
-                    "downloadsAllTime": it.get("downloadsAllTime"),
-                }
-            )
+        out[str(row_id)] = None  # rezervira mjesto da redoslijed ostane kao u serijskom radu
+        jobs.append((row_id, model_name, provider, build_query(model_name, provider)))
 
+    memo = fetch_queries({q for _, _, _, q in jobs}, args)
+
+    for row_id, model_name, provider, q in jobs:
         out[str(row_id)] = {
             "kaggle_row_id": row_id,
             "model_name": model_name,
             "provider": provider,
             "query": q,
-            "candidates": candidates,
+            "candidates": filter_candidates(memo[q], provider),
         }
 
-        time.sleep(0.15)
-
     with open(OUT_JSON, "w", encoding="utf-8") as f:
         json.dump(out, f, ensure_ascii=False, indent=2)
+    if os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
 
     print("Saved:", OUT_JSON, "rows=", len(out))
 
@@ -1,21 +1,34 @@
+import argparse
+import itertools
 import json
 import os
 import re
-import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
 
+from columnar import read_table, write_table
+from hf_cache import MetricsCache
+from hf_client import HF_ENDPOINT, TokenBucket, get_with_retry, make_session
+from hf_matcher import RepoMatcher, match_candidates
+from hf_snapshot import SNAPSHOT_PATH, load_snapshot
+from repo_agg import load_agg_state, save_agg_state, update_repo_level
+from schema import compact_frame, memory_report
+
 KAGGLE_CLEAN = "data/processed/kaggle_clean.csv"
 CANDIDATES_JSON = "data/raw/hf_candidates_by_row.json"
 
 OUT_MAP = "data/processed/kaggle_to_hf_map.csv"
 OUT_MERGED = "data/processed/merged_llm_data.csv"
 OUT_REPO_LEVEL = "data/processed/merged_llm_data_repo_level.csv"
+AGG_STATE = "data/processed/repo_agg_state.cols"
 
 HF_CACHE = "data/raw/hf_metrics_by_repo.json"
-HF_MODEL_URL = "https://huggingface.co/api/models/{}"
+HF_CACHE_DB = "data/raw/hf_metrics_cache.sqlite"
+HF_MODEL_URL = HF_ENDPOINT + "/api/models/{}"
+HF_RATE = 5.0
 
 CLOSED = {"openai", "google", "anthropic", "aws"}
 
@@ -78,6 +91,89 @@ def choose_best_candidate(row: pd.Series, candidates: list[dict]) -> Optional[st
     return (filt[0].get("id") or "").strip() or None
 
 
+def candidates_table(cand_by_row: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    lists = [(rec or {}).get("candidates", []) for rec in cand_by_row.values()]
+    lengths = np.fromiter((len(x) for x in lists), dtype=np.int64, count=len(lists))
+    starts = np.cumsum(lengths) - lengths
+
+    tbl = pd.DataFrame.from_records(
+        list(itertools.chain.from_iterable(lists)),
+        columns=["id", "downloads", "likes", "downloadsAllTime"],
+    )
+    tbl.insert(0, "kaggle_row_id", np.repeat(np.array(list(cand_by_row.keys()), dtype=np.int64), lengths))
+    tbl.insert(1, "pos", np.arange(len(tbl), dtype=np.int64) - np.repeat(starts, lengths))
+    # isti repozitoriji ponavljaju se u mnogo redaka, pa se string operacije rade samo nad jedinstvenim id-evima
+    codes, uniques = pd.factorize(tbl["id"].fillna("").astype(str))
+    tbl["id"] = pd.Index(uniques).str.strip().take(codes)
+    for c in ["downloads", "likes", "downloadsAllTime"]:
+        tbl[c] = pd.to_numeric(tbl[c], errors="coerce").fillna(0).astype("int64")
+    return tbl
+
+
+def select_best_candidates(df: pd.DataFrame, cands: pd.DataFrame) -> pd.Series:
+    rows = pd.DataFrame({
+        "kaggle_row_id": df["kaggle_row_id"].astype("int64"),
+        "provider_norm": df["provider"].astype(str).str.strip().str.lower(),
+        "tok": df["model_name"].astype(str).str.strip().str.lower()
+               .str.extract(r"^(llama-\d+)$", expand=False).fillna(""),
+    })
+    rows = rows[~rows["provider_norm"].isin(CLOSED)]
+
+    c = cands[cands["id"] != ""].merge(rows, on="kaggle_row_id", how="inner")
+    codes, uniques = pd.factorize(c["id"])
+    uniques = pd.Series(uniques, dtype=object)
+    uniques_lower = uniques.str.lower()
+    keep = np.ones(len(c), dtype=bool)
+
+    # filtri se primjenjuju po grupama s istim prefiksima / tokenom, kojih ima tek nekoliko
+    for provider_norm, idx in c.groupby("provider_norm", sort=False).indices.items():
+        prefixes = provider_prefixes(provider_norm)
+        if prefixes:
+            keep[idx] &= uniques.str.startswith(tuple(prefixes)).to_numpy()[codes[idx]]
+    for tok, idx in c.groupby("tok", sort=False).indices.items():
+        if tok:
+            keep[idx] &= uniques_lower.str.contains(tok, regex=False).to_numpy()[codes[idx]]
+    c = c[keep]
+
+    # grupirani arg-max: najveći (downloads, likes, downloadsAllTime), a kod izjednačenja prvi po redoslijedu.
+    # match_score iz lokalnog matchera odlučuje samo koji repoi ulaze u top-k kandidata; izbor među njima
+    # ide po popularnosti kao i za kandidate iz HF pretrage (koji match_score nemaju) i u choose_best_candidate
+    order = np.lexsort((
+        c["pos"].to_numpy(),
+        -c["downloadsAllTime"].to_numpy(),
+        -c["likes"].to_numpy(),
+        -c["downloads"].to_numpy(),
+        c["kaggle_row_id"].to_numpy(),
+    ))
+    best = c.iloc[order].drop_duplicates("kaggle_row_id", keep="first")
+    return best.set_index("kaggle_row_id")["id"]
+
+
+def build_map(df: pd.DataFrame, cand_by_row: Dict[str, Dict[str, Any]], vectorized: bool = True) -> pd.DataFrame:
+    if not vectorized:
+        map_rows = []
+        for _, row in df.iterrows():
+            row_id = int(row["kaggle_row_id"])
+            rec = cand_by_row.get(str(row_id))
+            candidates = (rec or {}).get("candidates", [])
+            best = choose_best_candidate(row, candidates)
+
+            map_rows.append(
+                {
+                    "kaggle_row_id": row_id,
+                    "model_name": row["model_name"],
+                    "provider": row["provider"],
+                    "hf_repo_id": best or "",
+                }
+            )
+        return pd.DataFrame(map_rows)
+
+    best = select_best_candidates(df, candidates_table(cand_by_row))
+    mp = df[["kaggle_row_id", "model_name", "provider"]].copy()
+    mp["hf_repo_id"] = mp["kaggle_row_id"].map(best).fillna("")
+    return mp.reset_index(drop=True)
+
+
 def load_cache(path: str) -> Dict[str, Dict[str, Any]]:
     if os.path.exists(path):
         with open(path, "r", encoding="utf-8") as f:
@@ -91,9 +187,21 @@ def save_cache(path: str, cache: Dict[str, Dict[str, Any]]) -> None:
         json.dump(cache, f, ensure_ascii=False, indent=2)
 
 
-def fetch_hf_metrics(repo_id: str) -> Dict[str, Any]:
+def fetch_hf_metrics(
+    repo_id: str,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+    etag: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    if session is None:
+        # samostalan poziv dobiva vlastitu sesiju koja se odmah zatvara
+        with make_session(1) as s:
+            return fetch_hf_metrics(repo_id, s, limiter, etag)
     url = HF_MODEL_URL.format(repo_id)
-    r = requests.get(url, timeout=60)
+    headers = {"If-None-Match": etag} if etag else None
+    r = get_with_retry(session, url, headers=headers, limiter=limiter)
+    if r.status_code == 304:
+        return None, etag
     if r.status_code != 200:
         return {
             "hf_repo_id": repo_id,
@@ -101,7 +209,7 @@ def fetch_hf_metrics(repo_id: str) -> Dict[str, Any]:
             "hf_likes": None,
             "hf_downloads": None,
             "hf_downloads_all_time": None,
-        }
+        }, None
     obj = r.json()
     return {
         "hf_repo_id": repo_id,
@@ -109,92 +217,138 @@ def fetch_hf_metrics(repo_id: str) -> Dict[str, Any]:
         "hf_likes": obj.get("likes"),
         "hf_downloads": obj.get("downloads"),
         "hf_downloads_all_time": obj.get("downloadsAllTime"),
-    }
+    }, r.headers.get("ETag")
+
+
+def _transient(hf_status: str) -> bool:
+    # 429 i 5xx prolaze same od sebe; ostali kodovi (npr. 404 za obrisan ili preimenovan repo) su trajni
+    code = hf_status.removeprefix("http_")
+    return code == "429" or code.startswith("5")
+
+
+def refresh_metrics(store: MetricsCache, repo_ids: list[str]) -> int:
+    limiter = TokenBucket(HF_RATE)
+    n_fetched = 0
+    with make_session(1) as session:
+        for rid in repo_ids:
+            if store.is_fresh(rid):
+                continue
+            old = store.get(rid)
+            was_ok = old is not None and old.get("hf_status") == "ok"
+            try:
+                metrics, etag = fetch_hf_metrics(rid, session=session, limiter=limiter, etag=store.etag(rid))
+            except (requests.ConnectionError, requests.Timeout):
+                if not was_ok:
+                    raise
+                # bez veze nakon svih ponovnih pokušaja ostaje ispravan zapis; revalidira se sljedeći put
+                continue
+            n_fetched += 1
+            if metrics is None:
+                store.touch(rid)
+            elif was_ok and _transient(metrics["hf_status"]):
+                # prolazna greška kod revalidacije ne smije pregaziti ispravan zapis
+                continue
+            else:
+                store.put(rid, metrics, etag)
+    return n_fetched
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    ap = argparse.ArgumentParser(description="Integracija Kaggle + Hugging Face podataka.")
+    ap.add_argument("--ttl-hours", type=float, default=None,
+                    help="starost nakon koje se HF metrike revalidiraju (zadano: nikad)")
+    ap.add_argument("--serial-mapping", action="store_true",
+                    help="odabir kandidata redak po redak (referentna implementacija)")
+    ap.add_argument("--snapshot", nargs="?", const=SNAPSHOT_PATH, default=None,
+                    help="HF metrike iz lokalnog snapshota kataloga, bez ijednog HTTP poziva")
+    ap.add_argument("--no-csv", action="store_true",
+                    help="međurezultate zapiši samo u binarnom stupčanom formatu, bez CSV izvoza")
+    ap.add_argument("--full-aggregate", action="store_true",
+                    help="repo-level tablicu izračunaj ispočetka, bez spremljenog stanja agregacije")
+    ap.add_argument("--matcher", action="store_true",
+                    help="kandidati iz indeksiranog fuzzy matchera nad snapshotom umjesto iz hf_candidates_by_row.json")
+    return ap.parse_args(argv)
+
+
+def load_candidates(df: pd.DataFrame, matcher: bool = False, snapshot: Optional[str] = None) -> dict:
+    if matcher:
+        cat = load_snapshot(snapshot or SNAPSHOT_PATH)
+        rows = zip(df["kaggle_row_id"], df["model_name"].astype(str), df["provider"].astype(str))
+        return match_candidates(rows, RepoMatcher.from_catalogue(cat), cat, provider_prefixes, CLOSED)
+    with open(CANDIDATES_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
 
 
-def main():
-    df = pd.read_csv(KAGGLE_CLEAN)
+def load_metrics(repo_ids: list[str], snapshot: Optional[str] = None, ttl_hours: Optional[float] = None) -> dict:
+    if snapshot:
+        cat = load_snapshot(snapshot)
+        return {rid: cat.metrics(rid) for rid in repo_ids}
 
-    with open(CANDIDATES_JSON, "r", encoding="utf-8") as f:
-        cand_by_row = json.load(f)
-
-    map_rows = []
-    for _, row in df.iterrows():
-        row_id = int(row["kaggle_row_id"])
-        rec = cand_by_row.get(str(row_id))
-        candidates = (rec or {}).get("candidates", [])
-        best = choose_best_candidate(row, candidates)
-
-        map_rows.append(
-            {
-                "kaggle_row_id": row_id,
-                "model_name": row["model_name"],
-                "provider": row["provider"],
-                "hf_repo_id": best or "",
-            }
-        )
+    ttl = None if ttl_hours is None else ttl_hours * 3600
+    with MetricsCache(HF_CACHE_DB, ttl_seconds=ttl) as store:
+        store.seed_from_json(HF_CACHE)
+        n_fetched = refresh_metrics(store, repo_ids)
+        cache = store.to_dict()
+    if n_fetched or not os.path.exists(HF_CACHE):
+        save_cache(HF_CACHE, cache)
+    return cache
 
-    mp = pd.DataFrame(map_rows)
-    os.makedirs("data/processed", exist_ok=True)
-    mp.to_csv(OUT_MAP, index=False, encoding="utf-8-sig")
 
+def map_rows(df: pd.DataFrame, mp: pd.DataFrame) -> pd.DataFrame:
     merged = df.merge(mp[["kaggle_row_id", "hf_repo_id"]], on="kaggle_row_id", how="left")
     merged["hf_repo_id"] = merged["hf_repo_id"].astype(str).str.strip()
-    merged = merged[merged["hf_repo_id"] != ""].copy()
-
-    cache = load_cache(HF_CACHE)
-    repo_ids = sorted(merged["hf_repo_id"].unique().tolist())
+    return merged[merged["hf_repo_id"] != ""].copy()
 
-    for rid in repo_ids:
-        if rid in cache:
-            continue
-        cache[rid] = fetch_hf_metrics(rid)
-        save_cache(HF_CACHE, cache)
-        time.sleep(0.2)
 
+def attach_metrics(merged: pd.DataFrame, cache: dict) -> pd.DataFrame:
     metrics_df = pd.DataFrame(list(cache.values()))
     merged = merged.merge(metrics_df, on="hf_repo_id", how="left")
-
     merged = merged[(merged["hf_status"] == "ok") & (~merged["hf_downloads"].isna())].copy()
-    merged.to_csv(OUT_MERGED, index=False, encoding="utf-8-sig")
-
-    numeric_cols = [
-        "context_window", "speed_tokens_per_sec", "latency_sec",
-        "benchmark_mmlu", "benchmark_chatbot_arena",
-        "price_per_million_tokens", "training_dataset_size",
-        "compute_power", "energy_efficiency",
-        "quality_rating", "speed_rating", "price_rating",
-        "open_source",
-    ]
-    numeric_cols = [c for c in numeric_cols if c in merged.columns]
-
-    repo_level = (
-        merged
-        .groupby("hf_repo_id", as_index=False)
-        .agg(
-            provider=("provider", lambda s: s.mode().iloc[0] if not s.mode().empty else s.iloc[0]),
-            n_kaggle_rows=("kaggle_row_id", "count"),
-            context_window=("context_window", "max"),
-            speed_tokens_per_sec=("speed_tokens_per_sec", "median"),
-            latency_sec=("latency_sec", "median"),
-            benchmark_mmlu=("benchmark_mmlu", "median"),
-            benchmark_chatbot_arena=("benchmark_chatbot_arena", "median"),
-            open_source=("open_source", "max"),
-            price_per_million_tokens=("price_per_million_tokens", "median"),
-            training_dataset_size=("training_dataset_size", "median"),
-            compute_power=("compute_power", "median"),
-            energy_efficiency=("energy_efficiency", "median"),
-            quality_rating=("quality_rating", "median"),
-            speed_rating=("speed_rating", "median"),
-            price_rating=("price_rating", "median"),
-            hf_status=("hf_status", "first"),
-            hf_likes=("hf_likes", "max"),
-            hf_downloads=("hf_downloads", "max"),
-            hf_downloads_all_time=("hf_downloads_all_time", "max"),
-        )
+    return compact_frame(merged)
+
+
+def integrate(
+    df: pd.DataFrame,
+    cand_by_row: dict,
+    metrics_for: Callable[[list[str]], dict],
+    vectorized: bool = True,
+    agg_state: Optional[tuple[pd.DataFrame, pd.DataFrame]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # čisti korak: HF metrike dolaze preko metrics_for, pa ga koriste i skripta i in-process način;
+    # uz agg_state (otisci redaka + prethodna repo-level tablica) ponovno se grupiraju samo dotaknuti repoi,
+    # i to iz cijelog merged framea
+    mp = build_map(df, cand_by_row, vectorized=vectorized)
+    merged = map_rows(df, mp)
+    cache = metrics_for(sorted(merged["hf_repo_id"].unique().tolist()))
+    merged = attach_metrics(merged, cache)
+    repo_level, fingerprints, touched = update_repo_level(merged, agg_state)
+    if touched is not None:
+        print(f"Repo-level: ponovno izračunato {len(touched)} repozitorija, {len(repo_level)} ukupno")
+    return mp, merged, repo_level, fingerprints
+
+
+def main():
+    args = parse_args()
+    df = read_table(KAGGLE_CLEAN)
+    mem_before = int(df.memory_usage(deep=True).sum())
+    df = compact_frame(df)
+    memory_report("kaggle_clean", df, mem_before)
+
+    cand_by_row = load_candidates(df, matcher=args.matcher, snapshot=args.snapshot)
+    agg_state = None if args.full_aggregate else load_agg_state(AGG_STATE, OUT_REPO_LEVEL)
+    mp, merged, repo_level, fingerprints = integrate(
+        df, cand_by_row,
+        metrics_for=lambda ids: load_metrics(ids, snapshot=args.snapshot, ttl_hours=args.ttl_hours),
+        vectorized=not args.serial_mapping,
+        agg_state=agg_state,
     )
+    memory_report("merged (row-level)", merged)
 
-    repo_level.to_csv(OUT_REPO_LEVEL, index=False, encoding="utf-8-sig")
+    os.makedirs("data/processed", exist_ok=True)
+    mp.to_csv(OUT_MAP, index=False, encoding="utf-8-sig")
+    write_table(merged, OUT_MERGED, csv=not args.no_csv)
+    write_table(repo_level, OUT_REPO_LEVEL, csv=not args.no_csv)
+    save_agg_state(AGG_STATE, fingerprints)
 
     print("Saved map:", OUT_MAP, "rows=", len(mp))
     print("Saved merged (row-level):", OUT_MERGED, "rows=", len(merged))
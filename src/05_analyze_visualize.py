@@ -1,13 +1,101 @@
+import argparse
+import hashlib
+import json
 import os
+from typing import Iterable, Optional
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from columnar import ColumnarWriter, cols_path, iter_table, read_table, table_exists, write_table
+from figures import BINNED_THRESHOLD, render_figures
+from schema import compact_frame, memory_report
+from sketches import CoMoments
 
 
 ROW_LEVEL_CSV = "data/processed/merged_llm_data.csv"
 REPO_LEVEL_CSV = "data/processed/merged_llm_data_repo_level.csv"
+NORMALIZED_CSV = "data/processed/merged_llm_data_repo_level_normalized.csv"
+STATS_JSON = "data/processed/repo_level_stats.json"
 FIG_DIR = "reports/figures"
 
+STATS_VERSION = 1
+STATS_CHUNK = 100_000
+
+ROW_COLUMNS = [
+    "provider", "context_window", "latency_sec", "speed_tokens_per_sec",
+    "benchmark_mmlu", "benchmark_chatbot_arena",
+]
+
+Z_COLS = ["context_window", "latency_sec", "speed_tokens_per_sec", "benchmark_mmlu", "hf_downloads", "hf_likes"]
+
+# grafovi kao podaci: vrsta (figures.RENDERERS), ulazni frame ("row", "repo" ili "corr") i parametri
+FIGURE_JOBS = [
+    {
+        "kind": "scatter",
+        "frame": "row",
+        "params": {
+            "x": "context_window",
+            "y": "latency_sec",
+            "title": "Odnos veličine konteksta i latencije (row-level)",
+            "xlabel": "context_window",
+            "ylabel": "latency_sec",
+            "filename": "01_context_vs_latency_row.png",
+            "logx": True,
+            "logy": False,
+        },
+    },
+    {
+        "kind": "scatter",
+        "frame": "row",
+        "params": {
+            "x": "context_window",
+            "y": "speed_tokens_per_sec",
+            "title": "Odnos veličine konteksta i brzine generiranja (row-level)",
+            "xlabel": "context_window",
+            "ylabel": "speed_tokens_per_sec",
+            "filename": "02_context_vs_speed_row.png",
+            "logx": True,
+            "logy": False,
+        },
+    },
+    {
+        "kind": "hist_by_provider",
+        "frame": "row",
+        "params": {
+            "value_col": "context_window",
+            "provider_col": "provider",
+            "title": "Raspodjela veličine konteksta po provideru (row-level, log skala)",
+            "xlabel": "context_window (log)",
+            "filename": "03_context_hist_by_provider.png",
+            "max_providers": 8,
+        },
+    },
+    {
+        "kind": "scatter",
+        "frame": "repo",
+        "params": {
+            "x": "context_window",
+            "y": "hf_downloads",
+            "title": "Odnos veličine konteksta i popularnosti (repo-level)",
+            "xlabel": "context_window",
+            "ylabel": "hf_downloads",
+            "filename": "04_context_vs_downloads_repo.png",
+            "logx": True,
+            "logy": True,
+        },
+    },
+    {
+        "kind": "corr_matrix",
+        "frame": "corr",
+        "params": {
+            "cols": [c + "_z" for c in Z_COLS],
+            "title": "Korelacija normaliziranih varijabli (repo-level, Z-score)",
+            "filename": "05_repo_level_corr_heatmap.png",
+        },
+    },
+]
+
 
 def ensure_dirs():
     os.makedirs(FIG_DIR, exist_ok=True)
@@ -20,127 +108,90 @@ def to_numeric(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     return df
 
 
-def zscore(series: pd.Series) -> pd.Series:
+def zscore(series: pd.Series, mu: float, sigma: float) -> pd.Series:
     s = pd.to_numeric(series, errors="coerce")
-    mu = s.mean(skipna=True)
-    sigma = s.std(skipna=True, ddof=0)
     if sigma == 0 or np.isnan(sigma):
         return s * 0
     return (s - mu) / sigma
 
 
-def save_scatter(
-    df: pd.DataFrame,
-    x: str,
-    y: str,
-    title: str,
-    xlabel: str,
-    ylabel: str,
-    filename: str,
-    logx: bool = False,
-    logy: bool = False,
-):
-    if x not in df.columns or y not in df.columns:
-        return
+def column_stats(df: pd.DataFrame, cols: list[str], chunksize: int = STATS_CHUNK) -> tuple[CoMoments, dict]:
+    return table_stats((df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize)), cols)
 
-    tmp = df[[x, y]].copy()
-    tmp[x] = pd.to_numeric(tmp[x], errors="coerce")
-    tmp[y] = pd.to_numeric(tmp[y], errors="coerce")
-    tmp = tmp.dropna()
 
-    if tmp.empty:
-        return
+def table_stats(chunks: Iterable[pd.DataFrame], cols: list[str]) -> tuple[CoMoments, dict]:
+    # jedan prolaz po chunkovima; CoMoments iz više chunkova ili procesa spajaju se s merge().
+    # Uz momente ide otisak ulaza (broj redaka i sha256 vrijednosti po retcima), isti za svaku podjelu na chunkove
+    stats = CoMoments(cols)
+    digest = hashlib.sha256()
+    n_rows = 0
+    for chunk in chunks:
+        x = np.ascontiguousarray(
+            to_numeric(chunk[cols].copy(), cols).astype("float64").to_numpy(dtype=np.float64, na_value=np.nan)
+        )
+        stats.update(x)
+        digest.update(x.tobytes())
+        n_rows += len(x)
+    return stats, {"n_rows": n_rows, "input_sha256": digest.hexdigest()}
 
-    plt.figure()
-    plt.scatter(tmp[x], tmp[y], alpha=0.7)
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-
-    if logx:
-        plt.xscale("log")
-    if logy:
-        plt.yscale("log")
-
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIG_DIR, filename), dpi=200)
-    plt.close()
-
-
-def save_hist_by_provider(
-    df: pd.DataFrame,
-    value_col: str,
-    provider_col: str,
-    title: str,
-    xlabel: str,
-    filename: str,
-    max_providers: int = 8,
-):
-    if value_col not in df.columns or provider_col not in df.columns:
-        return
 
-    tmp = df[[provider_col, value_col]].copy()
-    tmp[value_col] = pd.to_numeric(tmp[value_col], errors="coerce")
-    tmp[provider_col] = tmp[provider_col].astype(str).str.strip()
-    tmp = tmp.dropna(subset=[value_col])
-    if tmp.empty:
-        return
+def add_zscores(df: pd.DataFrame, stats: CoMoments) -> pd.DataFrame:
+    for c in stats.columns:
+        df[c + "_z"] = zscore(df[c], stats.column_mean(c), stats.column_std(c))
+    return df
 
-    counts = tmp[provider_col].value_counts()
-    providers = counts.head(max_providers).index.tolist()
-    tmp = tmp[tmp[provider_col].isin(providers)].copy()
-
-    plt.figure()
-    for p in providers:
-        vals = tmp.loc[tmp[provider_col] == p, value_col].dropna().values
-        if len(vals) > 0:
-            plt.hist(vals, bins=25, alpha=0.5, label=p)
-
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel("Frekvencija")
-    plt.xscale("log")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIG_DIR, filename), dpi=200)
-    plt.close()
-
-
-def save_corr_heatmap(df: pd.DataFrame, cols: list[str], title: str, filename: str):
-    usable = [c for c in cols if c in df.columns]
-    if len(usable) < 2:
-        return
 
-    tmp = df[usable].copy()
-    for c in usable:
-        tmp[c] = pd.to_numeric(tmp[c], errors="coerce")
-    tmp = tmp.dropna()
-    if tmp.empty:
-        return
+def corr_frame(stats: CoMoments) -> pd.DataFrame:
+    # korelacija Z-scoreova jednaka je korelaciji izvornih stupaca, pa se graf crta iz istih momenata
+    labels = [c + "_z" for c in stats.columns]
+    return pd.DataFrame(stats.corr(), index=labels, columns=labels)
 
-    corr = tmp.corr(numeric_only=True)
 
-    plt.figure()
-    plt.imshow(corr.values, aspect="auto")
-    plt.title(title)
-    plt.xticks(range(len(usable)), usable, rotation=45, ha="right")
-    plt.yticks(range(len(usable)), usable)
-    plt.colorbar()
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIG_DIR, filename), dpi=200)
-    plt.close()
+def save_stats(stats: CoMoments, path: str, fingerprint: dict) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": STATS_VERSION, **fingerprint, **stats.to_dict()}, f)
+    os.replace(path + ".tmp", path)
 
 
-def main():
-    ensure_dirs()
+def load_stats(path: str) -> tuple[CoMoments, dict]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Nedostaje {path}. Prvo pokreni 05_analyze_visualize.py bez --from-stats.")
+    with open(path, "r", encoding="utf-8") as f:
+        d = json.load(f)
+    if d.get("version") != STATS_VERSION:
+        raise ValueError(f"{path}: nepoznata verzija statistike {d.get('version')}")
+    return CoMoments.from_dict(d), {"n_rows": d.get("n_rows"), "input_sha256": d.get("input_sha256")}
 
-    if not os.path.exists(ROW_LEVEL_CSV):
-        raise FileNotFoundError(f"Nedostaje {ROW_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
-    if not os.path.exists(REPO_LEVEL_CSV):
-        raise FileNotFoundError(f"Nedostaje {REPO_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
 
-    row_df = pd.read_csv(ROW_LEVEL_CSV)
-    repo_df = pd.read_csv(REPO_LEVEL_CSV)
+def current_stats(path: str, in_csv: str) -> CoMoments:
+    # spremljeni momenti vrijede samo za repo-level tablicu iz koje su izračunati; nakon ponovnog 04
+    # računaju se iznova jednim prolazom po chunkovima i spremaju umjesto starih
+    stats, fingerprint = load_stats(path)
+    fresh, current = table_stats(iter_table(in_csv, STATS_CHUNK, columns=stats.columns), stats.columns)
+    if current == fingerprint:
+        return stats
+    print(f"{path} ne odgovara trenutnoj tablici {in_csv}; momenti su izračunati iznova.")
+    save_stats(fresh, path, current)
+    return fresh
+
+
+def analyze(
+    row_df: pd.DataFrame,
+    repo_df: pd.DataFrame,
+    workers: Optional[int] = None,
+    force: bool = False,
+    binned_threshold: Optional[int] = None,
+) -> pd.DataFrame:
+    ensure_dirs()
+
+    row_df = row_df[[c for c in ROW_COLUMNS if c in row_df.columns]]
+    # row-level frame služi samo za grafove, pa smije u float32; repo-level se zapisuje natrag u CSV
+    mem_before = int(row_df.memory_usage(deep=True).sum())
+    row_df = compact_frame(row_df, float32=True)
+    memory_report("row-level", row_df, mem_before)
+    mem_before = int(repo_df.memory_usage(deep=True).sum())
+    repo_df = compact_frame(repo_df)
+    memory_report("repo-level", repo_df, mem_before)
 
     row_numeric = [
         "context_window",
@@ -164,69 +215,82 @@ def main():
     row_df = to_numeric(row_df, row_numeric)
     repo_df = to_numeric(repo_df, repo_numeric)
 
-    save_scatter(
-        df=row_df,
-        x="context_window",
-        y="latency_sec",
-        title="Odnos veličine konteksta i latencije (row-level)",
-        xlabel="context_window",
-        ylabel="latency_sec",
-        filename="01_context_vs_latency_row.png",
-        logx=True,
-        logy=False,
-    )
+    stats, fingerprint = column_stats(repo_df, [c for c in Z_COLS if c in repo_df.columns])
+    save_stats(stats, STATS_JSON, fingerprint)
+    repo_norm = add_zscores(repo_df.copy(), stats)
 
-    save_scatter(
-        df=row_df,
-        x="context_window",
-        y="speed_tokens_per_sec",
-        title="Odnos veličine konteksta i brzine generiranja (row-level)",
-        xlabel="context_window",
-        ylabel="speed_tokens_per_sec",
-        filename="02_context_vs_speed_row.png",
-        logx=True,
-        logy=False,
+    rendered, skipped = render_figures(
+        FIGURE_JOBS, {"row": row_df, "repo": repo_df, "corr": corr_frame(stats)}, FIG_DIR,
+        workers=workers, force=force, binned_threshold=binned_threshold,
     )
+    print(f"Grafovi: iscrtano {len(rendered)}, nepromijenjeno {len(skipped)}")
+
+    return repo_norm
+
+
+def normalize_from_stats(
+    in_csv: str,
+    out_csv: str,
+    stats: CoMoments,
+    chunksize: int = STATS_CHUNK,
+    csv: bool = True,
+) -> int:
+    # Z-score je transformacija po retku uz spremljene momente, pa se tablica obrađuje chunk po chunk
+    tmp_path = out_csv + ".tmp"
+    n_rows = 0
+    with ColumnarWriter(cols_path(out_csv)) as cols:
+        for chunk in iter_table(in_csv, chunksize):
+            chunk = add_zscores(to_numeric(chunk, stats.columns), stats)
+            cols.append(chunk)
+            if csv:
+                chunk.to_csv(tmp_path, index=False, mode="a" if n_rows else "w", header=not n_rows,
+                             encoding="utf-8" if n_rows else "utf-8-sig")
+            n_rows += len(chunk)
+        if csv:
+            os.replace(tmp_path, out_csv)
+    return n_rows
 
-    save_hist_by_provider(
-        df=row_df,
-        value_col="context_window",
-        provider_col="provider",
-        title="Raspodjela veličine konteksta po provideru (row-level, log skala)",
-        xlabel="context_window (log)",
-        filename="03_context_hist_by_provider.png",
-        max_providers=8,
-    )
 
-    save_scatter(
-        df=repo_df,
-        x="context_window",
-        y="hf_downloads",
-        title="Odnos veličine konteksta i popularnosti (repo-level)",
-        xlabel="context_window",
-        ylabel="hf_downloads",
-        filename="04_context_vs_downloads_repo.png",
-        logx=True,
-        logy=True,
-    )
+def main():
+    ap = argparse.ArgumentParser(description="Analiza i vizualizacija integriranih podataka.")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="broj procesa za crtanje grafova (zadano: broj jezgri)")
+    ap.add_argument("--force", action="store_true",
+                    help="iscrtaj sve grafove iako im se ulazi nisu promijenili")
+    ap.add_argument("--binned-threshold", type=int, default=None,
+                    help=f"iznad ovoliko točaka graf se crta iz agregirane mreže (zadano: {BINNED_THRESHOLD})")
+    ap.add_argument("--from-stats", action="store_true",
+                    help=f"normalizirani CSV i heatmapa iz spremljenih momenata ({STATS_JSON}), bez učitavanja cijele tablice")
+    args = ap.parse_args()
+
+    if args.from_stats:
+        if not table_exists(REPO_LEVEL_CSV):
+            raise FileNotFoundError(f"Nedostaje {REPO_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
+        stats = current_stats(STATS_JSON, REPO_LEVEL_CSV)
+        ensure_dirs()
+        jobs = [job for job in FIGURE_JOBS if job["frame"] == "corr"]
+        rendered, skipped = render_figures(jobs, {"corr": corr_frame(stats)}, FIG_DIR, force=args.force)
+        print(f"Grafovi: iscrtano {len(rendered)}, nepromijenjeno {len(skipped)}")
+        n_rows = normalize_from_stats(REPO_LEVEL_CSV, NORMALIZED_CSV, stats)
+        print("Repo-level normalizirani CSV je spremljen u:", NORMALIZED_CSV, "rows=", n_rows)
+        return
+
+    if not table_exists(ROW_LEVEL_CSV):
+        raise FileNotFoundError(f"Nedostaje {ROW_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
+    if not table_exists(REPO_LEVEL_CSV):
+        raise FileNotFoundError(f"Nedostaje {REPO_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
 
-    repo_norm = repo_df.copy()
-    for c in ["context_window", "latency_sec", "speed_tokens_per_sec", "benchmark_mmlu", "hf_downloads", "hf_likes"]:
-        if c in repo_norm.columns:
-            repo_norm[c + "_z"] = zscore(repo_norm[c])
+    # grafovi na razini retka trebaju samo nekoliko stupaca; ostali se ni ne učitavaju
+    row_df = read_table(ROW_LEVEL_CSV, columns=ROW_COLUMNS)
+    repo_df = read_table(REPO_LEVEL_CSV)
 
-    save_corr_heatmap(
-        df=repo_norm,
-        cols=[c for c in ["context_window_z", "latency_sec_z", "speed_tokens_per_sec_z", "benchmark_mmlu_z", "hf_downloads_z", "hf_likes_z"] if c in repo_norm.columns],
-        title="Korelacija normaliziranih varijabli (repo-level, Z-score)",
-        filename="05_repo_level_corr_heatmap.png",
-    )
+    repo_norm = analyze(row_df, repo_df, workers=args.workers, force=args.force,
+                        binned_threshold=args.binned_threshold)
 
-    out_norm_csv = "data/processed/merged_llm_data_repo_level_normalized.csv"
-    repo_norm.to_csv(out_norm_csv, index=False, encoding="utf-8-sig")
+    write_table(repo_norm, NORMALIZED_CSV)
 
     print("Gotovo. Grafovi su spremljeni u:", FIG_DIR)
-    print("Repo-level normalizirani CSV je spremljen u:", out_norm_csv)
+    print("Repo-level normalizirani CSV je spremljen u:", NORMALIZED_CSV)
 
 
 if __name__ == "__main__":
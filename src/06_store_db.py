@@ -1,7 +1,18 @@
+import argparse
+import hashlib
+import itertools
+import json
 import os
 import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
 import pandas as pd
 
+from columnar import read_table, table_exists
+from schema import compact_frame, memory_report
+
 ROW_LEVEL_CSV = "data/processed/merged_llm_data.csv"
 REPO_LEVEL_CSV = "data/processed/merged_llm_data_repo_level.csv"
 DB_PATH = "data/processed/llm_context.db"
@@ -21,17 +32,7 @@ def _coerce_numeric(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     return df
 
 
-def main() -> None:
-    if not os.path.exists(ROW_LEVEL_CSV):
-        raise FileNotFoundError(f"Nedostaje {ROW_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
-    if not os.path.exists(REPO_LEVEL_CSV):
-        raise FileNotFoundError(f"Nedostaje {REPO_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
-
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-
-    row_df = pd.read_csv(ROW_LEVEL_CSV)
-    repo_df = pd.read_csv(REPO_LEVEL_CSV)
-
+def prepare(row_df: pd.DataFrame, repo_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     row_df = _clean_columns(row_df)
     repo_df = _clean_columns(repo_df)
 
@@ -69,29 +70,411 @@ def main() -> None:
     row_df = _coerce_numeric(row_df, row_numeric)
     repo_df = _coerce_numeric(repo_df, repo_numeric)
 
+    mem_before = int(row_df.memory_usage(deep=True).sum())
+    row_df = compact_frame(row_df)
+    memory_report("llm_row", row_df, mem_before)
+    mem_before = int(repo_df.memory_usage(deep=True).sum())
+    repo_df = compact_frame(repo_df)
+    memory_report("llm_repo", repo_df, mem_before)
+
     if "kaggle_row_id" not in row_df.columns:
         raise ValueError("U row-level CSV-u nedostaje stupac kaggle_row_id. Provjeri 03_clean_kaggle.py / 04_integrate.py.")
     if "hf_repo_id" not in repo_df.columns:
         raise ValueError("U repo-level CSV-u nedostaje stupac hf_repo_id. Provjeri 04_integrate.py.")
 
     row_df["kaggle_row_id"] = row_df["kaggle_row_id"].astype("Int64")
+    return row_df, repo_df
+
+
+def _row_hashes(df: pd.DataFrame, like: pd.DataFrame) -> pd.Series:
+    # vrijednosti iz baze i iz DataFramea svode se na isti oblik: brojevi kao float64, ostalo kao tekst
+    norm = {}
+    for c in like.columns:
+        if pd.api.types.is_numeric_dtype(like[c]):
+            norm[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+        else:
+            norm[c] = df[c].astype(object).where(df[c].notna(), None).astype(str)
+    return pd.util.hash_pandas_object(pd.DataFrame(norm), index=False)
+
+
+def _records(df: pd.DataFrame) -> list[tuple]:
+    # isto što zapisuje to_sql: NaN/NA kao NULL, numpy skalari kao Python int/float
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def upsert_table(conn: sqlite3.Connection, name: str, df: pd.DataFrame, key: str) -> Optional[tuple[int, int, int]]:
+    # vraća (ažurirano, dodano, obrisano) ili None ako tablicu treba zapisati ispočetka
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    expected = create_table_sql(name)
+    if row is None or " ".join(row[0].split()) != " ".join(expected.split()):
+        return None
+    if df[key].duplicated().any():
+        return None
+
+    # bez pandas SQL poziva: to_sql radi commit, a upsert_table se izvodi unutar transakcije iz upsert_db.
+    # Ulazni retci idu u privremenu tablicu (temp baza veze, nikad u datoteci baze) s afinitetom stupaca
+    # žive tablice, a razlika se traži po ključu: živa tablica se ne čita cijela, nego po primarnom ključu
+    # ulaznih id-jeva, a za brisanje se čitaju samo njezini ključevi
+    cols = ", ".join(f'"{c}"' for c in df.columns)
+    tmp = f'temp."_upsert_{name}"'
+    same = " AND ".join(f't."{c}" IS m."{c}"' for c in df.columns)
+    conn.execute(f"DROP TABLE IF EXISTS {tmp}")
+    conn.execute(f'CREATE TEMP TABLE "_upsert_{name}" AS SELECT {cols} FROM "{name}" WHERE 0')
+    try:
+        conn.executemany(f"INSERT INTO {tmp} ({cols}) VALUES ({', '.join('?' * len(df.columns))})", _records(df))
+        conn.execute(f'CREATE UNIQUE INDEX temp."_upsert_{name}_key" ON "_upsert_{name}"("{key}")')
+        # ključevi žive tablice čitaju se iz pokrivajućeg indeksa, ulazni retci traže se po primarnom ključu;
+        # CROSS JOIN drži privremenu tablicu vanjskom petljom
+        removed = [k for (k,) in conn.execute(
+            f'SELECT "{key}" FROM "{name}" m WHERE NOT EXISTS (SELECT 1 FROM {tmp} t WHERE t."{key}" = m."{key}")'
+        )]
+        changed = [k for (k,) in conn.execute(
+            f'SELECT t."{key}" FROM {tmp} t CROSS JOIN "{name}" m ON m."{key}" = t."{key}" WHERE NOT ({same})'
+        )]
+        conn.executemany(f'DELETE FROM "{name}" WHERE "{key}" = ?', [(k,) for k in removed])
+        # promijenjeni retci se ažuriraju na mjestu (isti rowid), novi se dodaju na kraj redoslijedom ulaza
+        conn.executemany(
+            f'UPDATE "{name}" SET ({cols}) = (SELECT {cols} FROM {tmp} WHERE "{key}" = ?) WHERE "{key}" = ?',
+            [(k, k) for k in changed],
+        )
+        added = conn.execute(
+            f'INSERT INTO "{name}" ({cols}) SELECT {cols} FROM {tmp} t '
+            f'WHERE NOT EXISTS (SELECT 1 FROM "{name}" m WHERE m."{key}" = t."{key}") ORDER BY t.rowid'
+        ).rowcount
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {tmp}")
+    return len(changed), added, len(removed)
+
+
+# eksplicitna shema umjesto pandas zaključivanja; tipovi odgovaraju onima koje je pandas prije
+# dodjeljivao, pa API vraća iste vrijednosti (medijani u llm_repo ostaju REAL)
+TABLES = {
+    "llm_row": [
+        ("kaggle_row_id", "INTEGER NOT NULL PRIMARY KEY"),
+        ("model_name", "TEXT"),
+        ("provider", "TEXT"),
+        ("context_window", "INTEGER"),
+        ("speed_tokens_per_sec", "INTEGER"),
+        ("latency_sec", "REAL"),
+        ("benchmark_mmlu", "INTEGER"),
+        ("benchmark_chatbot_arena", "INTEGER"),
+        ("open_source", "INTEGER"),
+        ("price_per_million_tokens", "REAL"),
+        ("training_dataset_size", "INTEGER"),
+        ("compute_power", "INTEGER"),
+        ("energy_efficiency", "REAL"),
+        ("quality_rating", "INTEGER"),
+        ("speed_rating", "INTEGER"),
+        ("price_rating", "INTEGER"),
+        ("hf_repo_id", "TEXT"),
+        ("hf_status", "TEXT"),
+        ("hf_likes", "INTEGER"),
+        ("hf_downloads", "INTEGER"),
+        ("hf_downloads_all_time", "INTEGER"),
+    ],
+    "llm_repo": [
+        ("hf_repo_id", "TEXT NOT NULL PRIMARY KEY"),
+        ("provider", "TEXT"),
+        ("n_kaggle_rows", "INTEGER NOT NULL"),
+        ("context_window", "INTEGER"),
+        ("speed_tokens_per_sec", "REAL"),
+        ("latency_sec", "REAL"),
+        ("benchmark_mmlu", "REAL"),
+        ("benchmark_chatbot_arena", "REAL"),
+        ("open_source", "INTEGER"),
+        ("price_per_million_tokens", "REAL"),
+        ("training_dataset_size", "REAL"),
+        ("compute_power", "REAL"),
+        ("energy_efficiency", "REAL"),
+        ("quality_rating", "REAL"),
+        ("speed_rating", "REAL"),
+        ("price_rating", "REAL"),
+        ("hf_status", "TEXT"),
+        ("hf_likes", "INTEGER"),
+        ("hf_downloads", "INTEGER"),
+        ("hf_downloads_all_time", "INTEGER"),
+    ],
+}
+# izvedene tablice: odgovori /providers/summary i /repo/<id> unaprijed izračunati pri izgradnji baze
+TABLES["provider_summary"] = [
+    ("rank", "INTEGER NOT NULL PRIMARY KEY"),
+    ("provider", "TEXT"),
+    ("n_rows", "INTEGER NOT NULL"),
+    ("avg_context_window", "REAL"),
+    ("avg_latency_sec", "REAL"),
+    ("avg_speed_tokens_per_sec", "REAL"),
+    ("avg_benchmark_mmlu", "REAL"),
+]
+TABLES["repo_detail"] = TABLES["llm_repo"] + [("kaggle_rows_json", "TEXT NOT NULL")]
+DERIVED_TABLES = ["provider_summary", "repo_detail"]
+# oznaka verzije sadržaja (db_meta.version); 07_api.py po njoj invalidira cache i gradi ETag
+TABLES["db_meta"] = [
+    ("key", "TEXT NOT NULL PRIMARY KEY"),
+    ("value", "TEXT NOT NULL"),
+]
+
+# stupci koje vraća /models i kaggle_rows u /repo/<id>; ulaze u indekse da upit ne čita tablicu
+MODELS_COLS = [
+    "model_name", "provider", "context_window", "latency_sec", "speed_tokens_per_sec",
+    "benchmark_mmlu", "benchmark_chatbot_arena",
+    "hf_repo_id", "hf_status", "hf_likes", "hf_downloads", "hf_downloads_all_time",
+]
+REPO_ROWS_COLS = [
+    "model_name", "provider", "latency_sec", "speed_tokens_per_sec", "benchmark_mmlu", "benchmark_chatbot_arena",
+]
+REPO_COLS = [c for c, _ in TABLES["llm_repo"] if c != "hf_repo_id"]
+
+PROVIDER_SUMMARY_SQL = """
+    INSERT INTO provider_summary
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC, provider),
+        provider,
+        COUNT(*),
+        AVG(context_window),
+        AVG(latency_sec),
+        AVG(speed_tokens_per_sec),
+        AVG(benchmark_mmlu)
+    FROM llm_row
+    GROUP BY provider
+"""
+
+REPO_ROWS_SQL = """
+    SELECT
+        hf_repo_id,
+        kaggle_row_id, model_name, provider,
+        context_window, latency_sec, speed_tokens_per_sec,
+        benchmark_mmlu, benchmark_chatbot_arena
+    FROM llm_row
+    WHERE hf_repo_id IS NOT NULL
+    ORDER BY hf_repo_id, context_window DESC, kaggle_row_id
+"""
+
+
+def _index(name: str, table: str, keys: list[str], include: list[str]) -> str:
+    # ključevi su filter i redoslijed upita u 07_api.py, ostali stupci su tu samo za pokrivanje
+    key_cols = [k.split()[0] for k in keys]
+    cols = [f'"{c}"{k[len(c):]}' for c, k in zip(key_cols, keys)] + [f'"{c}"' for c in include if c not in key_cols]
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(cols)})"
+
+
+INDEXES = [
+    # /models bez providera i s providerom: ORDER BY context_window DESC, kaggle_row_id
+    _index("idx_llm_row_models", "llm_row", ["context_window DESC", "kaggle_row_id"], MODELS_COLS),
+    _index("idx_llm_row_provider_models", "llm_row", ["provider", "context_window DESC", "kaggle_row_id"], MODELS_COLS),
+    # retci po repou redoslijedom iz /repo/<id> i GROUP BY provider za izvedene tablice;
+    # unutar providera redoslijedom kaggle_row_id, pa AVG zbraja istim redom kao nekad preko tablice
+    _index("idx_llm_row_repo_rows", "llm_row", ["hf_repo_id", "context_window DESC", "kaggle_row_id"], REPO_ROWS_COLS),
+    _index("idx_llm_row_provider_summary", "llm_row", ["provider", "kaggle_row_id"],
+           ["context_window", "latency_sec", "speed_tokens_per_sec", "benchmark_mmlu"]),
+    # /repos bez providera i s providerom: ORDER BY hf_downloads DESC, hf_repo_id
+    _index("idx_llm_repo_downloads", "llm_repo", ["hf_downloads DESC", "hf_repo_id"], REPO_COLS),
+    _index("idx_llm_repo_provider_downloads", "llm_repo", ["provider", "hf_downloads DESC", "hf_repo_id"], REPO_COLS),
+]
+
+
+def create_table_sql(name: str) -> str:
+    cols = ",\n".join(f'  "{c}" {decl}' for c, decl in TABLES[name])
+    return f'CREATE TABLE "{name}" (\n{cols}\n)'
+
+
+def refresh_derived(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM provider_summary")
+    conn.execute(PROVIDER_SUMMARY_SQL)
 
-    with sqlite3.connect(DB_PATH) as conn:
-        row_df.to_sql("llm_row", conn, if_exists="replace", index=False)
-        repo_df.to_sql("llm_repo", conn, if_exists="replace", index=False)
+    # JSON se serijalizira u Pythonu: SQLite json_object zapisuje REAL s 15 znamenki, a API vraća puni float
+    cols = ", ".join(f'"{c}"' for c, _ in TABLES["llm_repo"])
+    conn.execute("DELETE FROM repo_detail")
+    conn.execute(f"INSERT INTO repo_detail ({cols}, kaggle_rows_json) SELECT {cols}, '[]' FROM llm_repo")
+    cur = conn.execute(REPO_ROWS_SQL)
+    names = [d[0] for d in cur.description][1:]
+    conn.executemany(
+        "UPDATE repo_detail SET kaggle_rows_json = ? WHERE hf_repo_id = ?",
+        (
+            (json.dumps([dict(zip(names, r[1:])) for r in rows], ensure_ascii=False), repo_id)
+            for repo_id, rows in itertools.groupby(cur.fetchall(), key=lambda r: r[0])
+        ),
+    )
 
-        cur = conn.cursor()
 
-        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_llm_row_kaggle_row_id ON llm_row(kaggle_row_id)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_row_provider ON llm_row(provider)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_row_context_window ON llm_row(context_window)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_row_hf_repo_id ON llm_row(hf_repo_id)")
+def content_version(tables: list[tuple[str, pd.DataFrame, str]]) -> str:
+    # ovisi samo o shemi i sadržaju tablica, pa ponovna izgradnja s istim podacima daje istu verziju
+    h = hashlib.sha256()
+    for name in TABLES:
+        h.update(create_table_sql(name).encode())
+    for name, df, _ in tables:
+        h.update(json.dumps([name, list(df.columns)]).encode())
+        h.update(_row_hashes(df, df).to_numpy().tobytes())
+    return h.hexdigest()[:32]
 
-        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_llm_repo_hf_repo_id ON llm_repo(hf_repo_id)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_repo_provider ON llm_repo(provider)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_repo_context_window ON llm_repo(context_window)")
 
-        conn.commit()
+def write_meta(conn: sqlite3.Connection, version: str) -> None:
+    conn.execute("DELETE FROM db_meta")
+    conn.executemany(
+        "INSERT INTO db_meta (key, value) VALUES (?, ?)",
+        [("version", version), ("built_at", datetime.now(timezone.utc).isoformat(timespec="seconds"))],
+    )
+
+
+def conform(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    cols = [c for c, _ in TABLES[name]]
+    extra = [c for c in df.columns if c not in cols]
+    if extra:
+        raise ValueError(f"Stupci {extra} nisu u shemi tablice {name}. Dodaj ih u TABLES u 06_store_db.py.")
+    # stupac koji nedostaje u ulazu zapisuje se kao NULL
+    return df.reindex(columns=cols)
+
+
+# samo za vrijeme punjenja privremene baze; ako se proces prekine, živa baza ostaje netaknuta
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+def _remove_db(path: str) -> None:
+    for p in (path, path + "-wal", path + "-shm", path + "-journal"):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+# Windows ne dopušta zamjenu datoteke koju drži otvorena veza (07_api.py --pool); pool zatvara slobodne
+# veze čim vidi .tmp, pa se zamjena ponavlja dok zahtjevi u tijeku ne završe
+PUBLISH_TIMEOUT = 30.0
+
+
+def _publish(tmp_path: str, db_path: str) -> None:
+    deadline = time.monotonic() + PUBLISH_TIMEOUT
+    while True:
+        try:
+            os.replace(tmp_path, db_path)
+            return
+        except PermissionError:
+            if time.monotonic() > deadline:
+                raise PermissionError(
+                    f"{db_path} je i nakon {PUBLISH_TIMEOUT:.0f}s otvoren u drugom procesu; nova baza je ostala u {tmp_path}."
+                ) from None
+            time.sleep(0.1)
+
+
+def build_db(tables: list[tuple[str, pd.DataFrame]], db_path: str, version: str) -> None:
+    # nova baza se puni pokraj žive i zamjenjuje je jednim os.replace, pa 07_api.py nikad ne vidi
+    # djelomično zapisane tablice
+    tmp_path = db_path + ".tmp"
+    _remove_db(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        with conn:
+            for name in TABLES:
+                conn.execute(create_table_sql(name))
+            for name, df in tables:
+                df.to_sql(name, conn, if_exists="append", index=False)
+        with conn:
+            for sql in INDEXES:
+                conn.execute(sql)
+            refresh_derived(conn)
+            write_meta(conn, version)
+        conn.execute("ANALYZE")
+        # natrag u rollback journal: WAL se zapiše u glavnu datoteku, pa je baza jedna datoteka
+        conn.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        conn.close()
+        _remove_db(tmp_path)
+        raise
+    conn.close()
+    _publish(tmp_path, db_path)
+
+
+def _upsert_tables(
+    conn: sqlite3.Connection,
+    tables: list[tuple[str, pd.DataFrame, str]],
+    version: str,
+) -> Optional[list[tuple[int, int, int]]]:
+    for name in DERIVED_TABLES + ["db_meta"]:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+        if row is None or " ".join(row[0].split()) != " ".join(create_table_sql(name).split()):
+            return None
+    results = []
+    for name, df, key in tables:
+        counts = upsert_table(conn, name, df, key)
+        if counts is None:
+            return None
+        results.append(counts)
+    for sql in INDEXES:
+        conn.execute(sql)
+    # izvedene tablice su male (po jedan redak po provideru/repou), pa se uvijek izračunaju ponovno
+    refresh_derived(conn)
+    write_meta(conn, version)
+    return results
+
+
+def _rollback(conn: sqlite3.Connection) -> None:
+    # BEGIN IMMEDIATE ... ROLLBACK: neuspjeli upsert ne mijenja datoteku baze
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+
+
+def upsert_db(
+    tables: list[tuple[str, pd.DataFrame, str]],
+    db_path: str,
+    version: str,
+) -> Optional[list[tuple[int, int, int]]]:
+    # sve tablice u jednoj transakciji; ako ijedna ne može inkrementalno, ništa se ne mijenja.
+    # Transakcija se vodi ručno (isolation_level=None): čitatelji do COMMIT-a vide staru bazu i stari db_meta
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = _upsert_tables(conn, tables, version)
+        except BaseException:
+            _rollback(conn)
+            raise
+        if results is None:
+            _rollback(conn)
+            return None
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA optimize")
+        return results
+    finally:
+        conn.close()
+
+
+def store(row_df: pd.DataFrame, repo_df: pd.DataFrame, db_path: str = DB_PATH, upsert: bool = False) -> None:
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    row_df, repo_df = prepare(row_df, repo_df)
+    tables = [
+        ("llm_row", conform("llm_row", row_df), "kaggle_row_id"),
+        ("llm_repo", conform("llm_repo", repo_df), "hf_repo_id"),
+    ]
+
+    version = content_version(tables)
+    results = upsert_db(tables, db_path, version) if upsert else None
+    if results is None:
+        if upsert:
+            print("Shema baze se promijenila ili baza ne postoji; gradi se ispočetka.")
+        build_db([(name, df) for name, df, _ in tables], db_path, version)
+        return
+    for (name, _, _), counts in zip(tables, results):
+        print(f"{name}: ažurirano {counts[0]}, dodano {counts[1]}, obrisano {counts[2]} redaka")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Pohrana integriranih podataka u SQLite bazu.")
+    ap.add_argument("--upsert", action="store_true",
+                    help="u postojećoj bazi ažuriraj samo promijenjene, nove i obrisane retke umjesto ponovne izgradnje baze")
+    args = ap.parse_args()
+
+    if not table_exists(ROW_LEVEL_CSV):
+        raise FileNotFoundError(f"Nedostaje {ROW_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
+    if not table_exists(REPO_LEVEL_CSV):
+        raise FileNotFoundError(f"Nedostaje {REPO_LEVEL_CSV}. Prvo pokreni 04_integrate.py.")
+
+    store(read_table(ROW_LEVEL_CSV), read_table(REPO_LEVEL_CSV), DB_PATH, upsert=args.upsert)
 
     print(f"Gotovo. Baza je spremljena u: {DB_PATH}")
     print("Tablice: llm_row (row-level) i llm_repo (repo-level).")
@@ -1,15 +1,87 @@
+import argparse
+import base64
+import json
 import os
+import re
 import sqlite3
-from urllib.parse import quote
+import sys
+import threading
+from typing import Callable, Optional
+from urllib.parse import quote, urlencode
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
+
+import compression
+from column_engine import ColumnEngine
+from db_source import DatabaseSource
+from response_cache import ResponseCache
 
 DB_PATH = "data/processed/llm_context.db"
 
 app = Flask(__name__)
 
-
-def get_conn() -> sqlite3.Connection:
+# postavlja se u main() uz --pool/--memory; None znači novu vezu po zahtjevu
+DB: Optional[DatabaseSource] = None
+
+# "sql", "numpy" (column_engine.py za /models i /repos) ili "compare" (oba, greška ako se razlikuju)
+ENGINES = ["sql", "numpy", "compare"]
+ENGINE = "sql"
+_engine_lock = threading.Lock()
+_engine: tuple[object, Optional[ColumnEngine]] = (None, None)
+
+# gotovi odgovori po ruti, parametrima i verziji baze (db_meta); None isključuje cache
+CACHE: Optional[ResponseCache] = ResponseCache()
+_meta: tuple[object, str] = (None, "")
+# stupci tablica za provjeru fields= (PRAGMA table_info), po verziji baze
+_columns: tuple[object, dict[str, list[str]]] = (None, {})
+
+MODELS_SELECT = """
+    SELECT
+        kaggle_row_id, model_name, provider,
+        context_window, latency_sec, speed_tokens_per_sec,
+        benchmark_mmlu, benchmark_chatbot_arena,
+        hf_repo_id, hf_status, hf_likes, hf_downloads, hf_downloads_all_time
+    FROM llm_row
+"""
+MODELS_ORDER = " ORDER BY context_window DESC, kaggle_row_id"
+
+REPOS_SELECT = "SELECT * FROM llm_repo"
+REPOS_ORDER = " ORDER BY hf_downloads DESC, hf_repo_id"
+
+# /repo/<id> i /providers/summary čitaju izvedene tablice koje 06_store_db.py izračuna pri izgradnji
+REPO_SQL = "SELECT * FROM repo_detail WHERE hf_repo_id = ?"
+# polje u odgovoru /repo/<id> -> stupac u repo_detail
+REPO_FIELD_COLUMNS = {"kaggle_rows": "kaggle_rows_json"}
+
+# POST /repos/batch i /models/batch: id-jevi idu kao jedan JSON parametar (json_each), pa broj id-jeva
+# ne ovisi o ograničenju broja parametara; CROSS JOIN drži json_each kao vanjsku petlju, tj. jedno
+# čitanje po primarnom ključu za svaki id
+MAX_BATCH = 2000
+
+PROVIDERS_SUMMARY_SQL = """
+    SELECT
+        provider, n_rows,
+        avg_context_window, avg_latency_sec, avg_speed_tokens_per_sec, avg_benchmark_mmlu
+    FROM provider_summary
+    ORDER BY rank
+"""
+
+# stupci po kojima je odgovor poredan; posljednji redak stranice je cursor za sljedeću
+CURSOR_KEYS = {"models": ("context_window", "kaggle_row_id"), "repos": ("hf_downloads", "hf_repo_id")}
+SQLITE_MAX_INT = 2 ** 63
+NDJSON = "application/x-ndjson"
+STREAM_BATCH = 500
+
+# zaglavlja koja se spremaju u cache uz tijelo odgovora
+CACHED_HEADERS = ["X-Next-Cursor", "Link", "Vary"]
+
+# tablice čiji su svi retci odgovor, pa je čitanje cijele tablice očekivano
+MATERIALIZED_TABLES = ["provider_summary"]
+# INTEGER PRIMARY KEY stupci su rowid tablice, pa ih plan upita zove rowid
+ROWID_COLUMNS = {"llm_row": "kaggle_row_id"}
+
+
+def connect() -> sqlite3.Connection:
     if not os.path.exists(DB_PATH):
         raise FileNotFoundError(f"Nedostaje {DB_PATH}. Prvo pokreni src/06_store_db.py.")
     conn = sqlite3.connect(DB_PATH)
@@ -17,112 +89,552 @@ def get_conn() -> sqlite3.Connection:
     return conn
 
 
-@app.get("/health")
-def health():
-    return jsonify({"status": "ok"})
-
+def get_conn() -> sqlite3.Connection:
+    # jedna veza po zahtjevu (iz poola ili nova); vraća se/zatvara u release_conn. Zahtjev čita unutar
+    # jedne transakcije, a prvo čitanje je verzija iz db_meta, pa je g.db_snapshot verzija baš onog
+    # stanja iz kojeg je odgovor izračunat, i kad 06_store_db.py --upsert mijenja bazu na mjestu
+    if "db_conn" not in g:
+        g.db_conn = DB.acquire() if DB is not None else (None, connect())
+        g.db_conn[1].execute("BEGIN")
+        g.db_snapshot = read_version(g.db_conn[1])
+    return g.db_conn[1]
+
+
+@app.before_request
+def cached_response():
+    if CACHE is None or request.method != "GET" or request.endpoint in (None, "health", "static"):
+        return None
+    # NDJSON se uvijek streama, a JSON iz cachea ne smije odgovoriti na Accept: application/x-ndjson
+    if wants_ndjson():
+        return None
+    g.cache_key = CACHE.key(request.path, list(request.args.items(multi=True)), db_version())
+    item = CACHE.get(g.cache_key)
+    if item is None:
+        return None
+    g.cache_hit = True
+    status, mimetype, body, etag, headers = item
+    resp = app.response_class(body, status=status, mimetype=mimetype, headers=list(headers))
+    resp.set_etag(etag)
+    return resp
+
+
+def compress_response(resp, key: Optional[tuple]) -> None:
+    resp.vary.add("Accept-Encoding")
+    encoding = compression.choose_encoding(request.accept_encodings, resp.is_streamed)
+    if encoding is None or "Content-Encoding" in resp.headers:
+        return
+    if resp.is_streamed:
+        resp.response = compression.compress_stream(resp.response, encoding)
+        resp.headers["Content-Encoding"] = encoding
+        return
+    body = resp.get_data()
+    if len(body) < compression.MIN_BYTES:
+        return
+    # komprimirana varijanta je zaseban unos u cacheu s vlastitim ETagom
+    item = CACHE.get(key + (encoding,)) if key is not None else None
+    if item is not None:
+        body, etag = item[2], item[3]
+    else:
+        body = compression.compress(body, encoding)
+        etag = CACHE.put(key + (encoding,), 200, resp.mimetype, body) if key is not None else None
+    resp.set_data(body)
+    resp.headers["Content-Encoding"] = encoding
+    if etag is not None:
+        resp.set_etag(etag)
+
+
+@app.after_request
+def store_response(resp):
+    key = g.pop("cache_key", None)
+    hit = g.pop("cache_hit", False)
+    # samo gotovi 200 odgovori; 304 je dopušten samo za uspješan odgovor
+    if resp.status_code != 200:
+        return resp
+    # odgovor izračunat iz drukčijeg stanja baze od onog u ključu (baza promijenjena između) se ne sprema
+    if key is not None and not hit:
+        if resp.is_streamed or g.get("db_snapshot") != key[2]:
+            key = None
+        else:
+            headers = tuple((h, resp.headers[h]) for h in CACHED_HEADERS if h in resp.headers)
+            resp.set_etag(CACHE.put(key, resp.status_code, resp.mimetype, resp.get_data(), headers))
+    # komprimirana varijanta se pamti samo uz nekomprimiranu iz cachea
+    compress_response(resp, key)
+    # If-None-Match se uspoređuje s ETagom varijante koja se stvarno šalje
+    if resp.get_etag()[0] is not None:
+        return resp.make_conditional(request)
+    return resp
+
+
+@app.teardown_appcontext
+def release_conn(exc):
+    item = g.pop("db_conn", None)
+    if item is None:
+        return
+    if item[1].in_transaction:
+        item[1].rollback()
+    if DB is not None:
+        DB.release(item)
+    else:
+        item[1].close()
 
-@app.get("/models")
-def models():
-    provider = (request.args.get("provider") or "").strip()
-    min_cw = request.args.get("min_context_window")
-    max_cw = request.args.get("max_context_window")
-    limit = request.args.get("limit", "200")
 
+def parse_limit(limit: str) -> int:
     try:
         limit_i = int(limit)
         if limit_i <= 0:
             limit_i = 200
-        limit_i = min(limit_i, 2000)
+        return min(limit_i, 2000)
     except ValueError:
-        limit_i = 200
+        return 200
 
+
+def parse_stream_limit(limit: Optional[str]) -> Optional[int]:
+    # NDJSON nema gornju granicu; bez limita se šalje sve od cursora do kraja
+    limit_i = parse_int(limit)
+    return limit_i if limit_i is not None and limit_i > 0 else None
+
+
+def parse_int(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def keyset_queries(
+    select: str,
+    where: list[str],
+    params: list,
+    sort_col: str,
+    tie_col: str,
+    after: Optional[tuple],
+    null_tail: bool,
+) -> list[tuple[str, list]]:
+    # redoslijed je (sort_col DESC, tie_col), NULL na kraju; nastavak iza retka (v, t) razdvaja se na
+    # dijelove od kojih svaki ide rasponom po indeksu: ostatak grupe "sort_col = v AND tie_col > t",
+    # pa "sort_col < v", pa NULL-ovi. sort_col ima malo različitih vrijednosti, pa uvjet bez tie_col
+    # u rasponu indeksa preskakao bi redak po redak sve ranije retke grupe
+    order = f" ORDER BY {sort_col} DESC, {tie_col}"
+
+    def query(extra: list[str], extra_params: list) -> tuple[str, list]:
+        conds = where + extra
+        where_sql = (" WHERE " + " AND ".join(conds)) if conds else ""
+        return select + where_sql + order, params + extra_params
+
+    if after is None:
+        return [query([], [])]
+    value, tie = after
+    if value is None:
+        # iza NULL-ova nema ničega ako ih filter ionako isključuje
+        if not null_tail:
+            return []
+        return [query([f"{sort_col} IS NULL", f"{tie_col} > ?"], [tie])]
+    out = [
+        query([f"{sort_col} = ?", f"{tie_col} > ?"], [value, tie]),
+        query([f"{sort_col} < ?"], [value]),
+    ]
+    if null_tail:
+        out.append(query([f"{sort_col} IS NULL"], []))
+    return out
+
+
+def models_query(
+    provider: str,
+    min_cw: Optional[int],
+    max_cw: Optional[int],
+    after: Optional[tuple] = None,
+) -> list[tuple[str, list]]:
     where = []
     params = []
 
     if provider:
         where.append("provider = ?")
         params.append(provider)
-
     if min_cw is not None:
-        try:
-            where.append("context_window >= ?")
-            params.append(int(min_cw))
-        except ValueError:
-            pass
-
+        where.append("context_window >= ?")
+        params.append(min_cw)
+    # granice po context_windowu ionako isključuju NULL-ove
+    null_tail = min_cw is None and max_cw is None
+    # max_cw i cursor su obje gornje granice po context_windowu i jedna je uvijek suvišna; s obje planer
+    # zna izabrati indeks bez providera i filtrirati provider redak po redak
+    if after is not None and after[0] is not None and max_cw is not None:
+        if after[0] > max_cw:
+            # cursor iza raspona ne isključuje nijedan redak do max_cw
+            after = None
+        else:
+            max_cw = None
     if max_cw is not None:
-        try:
-            where.append("context_window <= ?")
-            params.append(int(max_cw))
-        except ValueError:
-            pass
-
-    where_sql = (" WHERE " + " AND ".join(where)) if where else ""
-    sql = f"""
-        SELECT
-            kaggle_row_id, model_name, provider,
-            context_window, latency_sec, speed_tokens_per_sec,
-            benchmark_mmlu, benchmark_chatbot_arena,
-            hf_repo_id, hf_status, hf_likes, hf_downloads, hf_downloads_all_time
-        FROM llm_row
-        {where_sql}
-        ORDER BY context_window DESC
-        LIMIT ?
-    """
-    params.append(limit_i)
+        where.append("context_window <= ?")
+        params.append(max_cw)
+
+    return keyset_queries(MODELS_SELECT, where, params, "context_window", "kaggle_row_id", after, null_tail)
+
+
+def select_sql(table: str, columns: Optional[list[str]]) -> str:
+    # imena stupaca dolaze iz parse_fields, tj. iz sheme tablice
+    return f"SELECT {', '.join(columns) if columns else '*'} FROM {table}"
+
+
+def repos_query(
+    provider: str,
+    after: Optional[tuple] = None,
+    columns: Optional[list[str]] = None,
+) -> list[tuple[str, list]]:
+    where, params = (["provider = ?"], [provider]) if provider else ([], [])
+    select = REPOS_SELECT if columns is None else select_sql("llm_repo", columns)
+    return keyset_queries(select, where, params, "hf_downloads", "hf_repo_id", after, True)
+
+
+def repo_query(columns: Optional[list[str]] = None) -> str:
+    if columns is None:
+        return REPO_SQL
+    return select_sql("repo_detail", columns) + " WHERE hf_repo_id = ?"
+
+
+def batch_query(select: str, table: str, key: str) -> str:
+    return select.replace(f"FROM {table}", f"FROM json_each(?) AS ids CROSS JOIN {table} ON {table}.{key} = ids.value")
+
+
+def fetch_rows(conn: sqlite3.Connection, queries: list[tuple[str, list]], limit: int) -> list[dict]:
+    rows: list[dict] = []
+    for sql, params in queries:
+        if len(rows) >= limit:
+            break
+        rows.extend(dict(r) for r in conn.execute(sql + " LIMIT ?", params + [limit - len(rows)]))
+    return rows
+
 
+def encode_cursor(kind: str, row: dict) -> str:
+    sort_col, tie_col = CURSOR_KEYS[kind]
+    raw = json.dumps([kind, row[sort_col], row[tie_col]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, token: Optional[str]) -> Optional[tuple]:
+    # ValueError za cursor koji nije izdao ovaj endpoint
+    if not token:
+        return None
+    try:
+        name, value, tie = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Neispravan cursor.") from e
+    tie_type = int if kind == "models" else str
+    valid = (
+        name == kind
+        and (value is None or (type(value) in (int, float) and abs(value) < SQLITE_MAX_INT))
+        and type(tie) is tie_type
+        and (tie_type is str or abs(tie) < SQLITE_MAX_INT)
+    )
+    if not valid:
+        raise ValueError("Neispravan cursor.")
+    return value, tie
+
+
+class EngineMismatch(RuntimeError):
+    pass
+
+
+def _db_stamp() -> object:
+    # generacija iz DatabaseSource i stat datoteke: upsert na mjestu mijenja mtime/veličinu odmah,
+    # dok watcher generaciju poveća tek nakon --watch-interval
+    st = os.stat(DB_PATH)
+    return DB.generation if DB is not None else 0, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def read_version(conn: sqlite3.Connection) -> str:
+    # starija baza bez db_meta koristi stat datoteke
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return row[0] if row else f"stat:{_db_stamp()}"
+
+
+def snapshot_version() -> str:
+    get_conn()
+    return g.db_snapshot
+
+
+def db_version() -> str:
+    # za ključ cachea; db_meta se čita ponovno tek kad se baza promijeni, pa pogodak u cache ne otvara vezu.
+    # Može nakratko kasniti za bazom, ali store_response sprema odgovor samo pod verzijom iz koje je izračunat
+    global _meta
+    stamp = _db_stamp()
+    if _meta[0] != stamp:
+        _meta = (stamp, snapshot_version())
+    return _meta[1]
+
+
+def table_columns(table: str) -> list[str]:
+    global _columns
+    stamp = _db_stamp()
+    if _columns[0] != stamp:
+        _columns = (stamp, {})
+    cols = _columns[1].get(table)
+    if cols is None:
+        cols = [r[1] for r in get_conn().execute(f"PRAGMA table_info({table})")]
+        _columns[1][table] = cols
+    return cols
+
+
+def parse_fields(value: Optional[str], table: str, aliases: Optional[dict[str, str]] = None) -> Optional[list[str]]:
+    # "a,b" -> stupci tablice; None znači sve stupce. ValueError za polje kojeg nema u tablici
+    fields = [f.strip() for f in (value or "").split(",") if f.strip()]
+    if not fields:
+        return None
+    aliases = aliases or {}
+    columns = table_columns(table)
+    allowed = [c for c in columns if c not in aliases.values()] + [a for a, c in aliases.items() if c in columns]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Nepoznata polja: {', '.join(unknown)}. Dopuštena: {', '.join(allowed)}")
+    return list(dict.fromkeys(fields))
+
+
+def parse_batch_ids(id_type: type) -> list:
+    # tijelo je {"ids": [...]} ili sam popis; duplikati se izbacuju uz zadržani redoslijed
+    body = request.get_json(silent=True)
+    ids = body.get("ids") if isinstance(body, dict) else body
+    kind = "cijelih brojeva" if id_type is int else "stringova"
+    if not isinstance(ids, list) or not all(type(i) is id_type for i in ids):
+        raise ValueError(f'Tijelo zahtjeva mora biti {{"ids": [...]}} s popisom {kind}.')
+    if len(ids) > MAX_BATCH:
+        raise ValueError(f"Najviše {MAX_BATCH} id-jeva po zahtjevu.")
+    if id_type is int:
+        if any(abs(i) >= SQLITE_MAX_INT for i in ids):
+            raise ValueError("Id je izvan raspona SQLite INTEGER-a.")
+        return list(dict.fromkeys(ids))
+    return list(dict.fromkeys(i.strip() for i in ids))
+
+
+def repo_out(row) -> dict:
+    # retci s Kaggle koji sadrže navedeni repo spremljeni su uz repo kao gotov JSON
+    out = dict(row)
+    if "kaggle_rows_json" in out:
+        out["kaggle_rows"] = json.loads(out.pop("kaggle_rows_json"))
+    return out
+
+
+def project(rows: list[dict], fields: Optional[list[str]]) -> list[dict]:
+    if fields is None:
+        return rows
+    return [{k: r[k] for k in fields} for r in rows]
+
+
+def get_engine() -> ColumnEngine:
+    # učitava se jednom po verziji baze, iz transakcije zahtjeva, pa su stupci iste verzije kao g.db_snapshot
+    global _engine
+    version = snapshot_version()
+    if _engine[0] != version:
+        with _engine_lock:
+            if _engine[0] != version:
+                _engine = (version, ColumnEngine.load(get_conn(), MODELS_SELECT + MODELS_ORDER, REPOS_SELECT + REPOS_ORDER))
+    return _engine[1]
+
+
+def run_engine(
+    queries: list[tuple[str, list]],
+    limit: int,
+    numpy_select: Callable[[ColumnEngine], Optional[list[dict]]],
+    columns: Optional[list[str]] = None,
+) -> list[dict]:
+    rows = numpy_select(get_engine()) if ENGINE != "sql" else None
+    if rows is not None:
+        rows = project(rows, columns)
+    if ENGINE == "numpy" and rows is not None:
+        return rows
     with get_conn() as conn:
-        rows = conn.execute(sql, params).fetchall()
+        sql_rows = fetch_rows(conn, queries, limit)
+    if ENGINE == "compare" and rows is not None and rows != sql_rows:
+        raise EngineMismatch(f"numpy i sql daju različit rezultat za {request.full_path}")
+    return sql_rows
+
+
+def wants_ndjson() -> bool:
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", NDJSON]) == NDJSON
+
+
+def page_response(kind: str, rows: list[dict], limit: int, fields: Optional[list[str]] = None):
+    # traži se redak više od limita; ako postoji, postoji i sljedeća stranica
+    resp = jsonify(project(rows[:limit], fields))
+    resp.vary.add("Accept")
+    if len(rows) > limit:
+        cursor = encode_cursor(kind, rows[limit - 1])
+        args = [(k, v) for k, v in request.args.items(multi=True) if k != "cursor"] + [("cursor", cursor)]
+        resp.headers["X-Next-Cursor"] = cursor
+        resp.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return resp
+
+
+def stream_response(queries: list[tuple[str, list]], limit: Optional[int], fields: Optional[list[str]] = None):
+    # retci se čitaju u serijama od STREAM_BATCH i odmah šalju, pa memorija ne raste s brojem redaka;
+    # veza je vlastita jer generator živi dulje od zahtjeva
+    def generate():
+        item = DB.acquire() if DB is not None else None
+        conn = item[1] if item is not None else connect()
+        try:
+            remaining = limit
+            for sql, params in queries:
+                if remaining is not None:
+                    sql, params = sql + " LIMIT ?", params + [remaining]
+                cur = conn.execute(sql, params)
+                while batch := cur.fetchmany(STREAM_BATCH):
+                    yield "".join(app.json.dumps(r) + "\n" for r in project([dict(r) for r in batch], fields))
+                    if remaining is not None:
+                        remaining -= len(batch)
+                if remaining == 0:
+                    break
+        finally:
+            if item is not None:
+                DB.release(item)
+            else:
+                conn.close()
+
+    resp = app.response_class(generate(), mimetype=NDJSON)
+    resp.vary.add("Accept")
+    return resp
+
+
+def endpoint_queries() -> list[tuple[str, str, list, dict[str, list[str]]]]:
+    # svaki oblik upita koji API može poslati, s primjerom parametara i stupcima po tablici koje upit
+    # filtrira, pa ih indeks mora imati u uvjetu pretrage; cursor (v, t) ili (NULL, t)
+    out = []
+
+    def tie(sql: str, tie_col: str) -> list[str]:
+        # dio cursora unutar grupe izjednačenih mora tražiti i po tie_col, inače preskače ranije retke grupe
+        where = re.search(r" WHERE (.*) ORDER BY ", sql)
+        return [tie_col] if where and tie_col in where.group(1) else []
+
+    cursors = {"models": [None, (1, 1), (None, 1)], "repos": [None, (1, "r"), (None, "r")]}
+    for provider in ("", "p"):
+        for after in cursors["models"]:
+            for min_cw in (None, 1):
+                for max_cw in (None, 2):
+                    label = (
+                        f"/models provider={bool(provider)} min={min_cw is not None} max={max_cw is not None} "
+                        f"cursor={after}"
+                    )
+                    for i, (sql, params) in enumerate(models_query(provider, min_cw, max_cw, after)):
+                        cols = (["provider"] if provider else []) + (
+                            ["context_window"] if (min_cw, max_cw, after) != (None, None, None) else []
+                        ) + tie(sql, "kaggle_row_id")
+                        out.append((f"{label} #{i}", sql + " LIMIT ?", params + [200], {"llm_row": cols}))
+        for after in cursors["repos"]:
+            for i, (sql, params) in enumerate(repos_query(provider, after)):
+                cols = (["provider"] if provider else []) + (["hf_downloads"] if after else []) + tie(sql, "hf_repo_id")
+                label = f"/repos provider={bool(provider)} cursor={after} #{i}"
+                out.append((label, sql + " LIMIT ?", params + [200], {"llm_repo": cols}))
+        sql, params = repos_query(provider, None, ["hf_repo_id", "hf_downloads", "hf_likes"])[0]
+        cols = ["provider"] if provider else []
+        out.append((f"/repos provider={bool(provider)} fields", sql + " LIMIT ?", params + [200], {"llm_repo": cols}))
+    by_repo = {"repo_detail": ["hf_repo_id"]}
+    out.append(("/repo/<id>", REPO_SQL, ["r"], by_repo))
+    out.append(("/repo/<id> fields", repo_query(["hf_repo_id", "kaggle_rows_json"]), ["r"], by_repo))
+    out.append(("/providers/summary", PROVIDERS_SUMMARY_SQL, [], {}))
+    out.append((
+        "POST /repos/batch", batch_query(select_sql("repo_detail", ["hf_repo_id"]), "repo_detail", "hf_repo_id"),
+        ['["r"]'], by_repo,
+    ))
+    out.append((
+        "POST /models/batch", batch_query(MODELS_SELECT, "llm_row", "kaggle_row_id"), ["[1]"],
+        {"llm_row": ["kaggle_row_id"]},
+    ))
+    return out
+
+
+def plan_problems(detail: str, filters: dict[str, list[str]]) -> Optional[str]:
+    # SCAN po indeksu čita indeks redoslijedom ORDER BY i staje na LIMIT-u, pa je u redu samo bez filtra;
+    # SCAN bez indeksa čita cijelu tablicu. SEARCH mora imati sve filtrirane stupce u uvjetu indeksa,
+    # inače se ostali provjeravaju redak po redak
+    words = detail.split()
+    table = words[1] if words[0] in ("SCAN", "SEARCH") else None
+    required = filters.get(table, [])
+    if words[0] == "SCAN" and " INDEX " not in detail and table not in MATERIALIZED_TABLES:
+        return "čitanje cijele tablice"
+    if "TEMP B-TREE" in detail:
+        return "privremeni B-tree za sortiranje/grupiranje"
+    if words[0] == "SCAN" and required:
+        return f"čitanje cijelog indeksa, filter po {', '.join(required)} redak po redak"
+    if words[0] == "SEARCH" and required:
+        cond = re.search(r"\(([^()]*)\)$", detail)
+        used = {
+            ROWID_COLUMNS.get(table, col) if col == "rowid" else col
+            for col in re.findall(r"(\w+)\s*[=<>]", cond.group(1) if cond else "")
+        }
+        missing = [c for c in required if c not in used]
+        if missing:
+            return f"indeks ne pokriva filter po {', '.join(missing)}, provjera redak po redak"
+    return None
+
+
+def check_plans(db_path: str = DB_PATH) -> int:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    failed = 0
+    try:
+        for label, sql, params, filters in endpoint_queries():
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            problems = [p for p in (plan_problems(d, filters) for d in plan) if p]
+            failed += bool(problems)
+            print(("GREŠKA" if problems else "OK    "), label, "|", "; ".join(plan))
+            for p in problems:
+                print("       ", p)
+    finally:
+        conn.close()
+    return failed
 
-    return jsonify([dict(r) for r in rows])
+
+@app.get("/health")
+def health():
+    return jsonify({"status": "ok"})
+
+
+@app.get("/models")
+def models():
+    provider = (request.args.get("provider") or "").strip()
+    min_cw = parse_int(request.args.get("min_context_window"))
+    max_cw = parse_int(request.args.get("max_context_window"))
+    try:
+        after = decode_cursor("models", request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    queries = models_query(provider, min_cw, max_cw, after)
+    if wants_ndjson():
+        return stream_response(queries, parse_stream_limit(request.args.get("limit")))
+    limit_i = parse_limit(request.args.get("limit", "200"))
+    # NumPy put nema nastavak iza cursora, pa stranice iza prve idu na SQL
+    rows = run_engine(
+        queries, limit_i + 1,
+        lambda e: None if after else e.models.select(provider, limit_i + 1, min_cw, max_cw),
+    )
+    return page_response("models", rows, limit_i)
 
 
 @app.get("/repo/<path:hf_repo_id>")
 def repo_detail(hf_repo_id: str):
     hf_repo_id = hf_repo_id.strip()
+    try:
+        fields = parse_fields(request.args.get("fields"), "repo_detail", REPO_FIELD_COLUMNS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    columns = None if fields is None else [REPO_FIELD_COLUMNS.get(f, f) for f in fields]
 
     with get_conn() as conn:
-        repo = conn.execute("SELECT * FROM llm_repo WHERE hf_repo_id = ? LIMIT 1", (hf_repo_id,)).fetchone()
-        if repo is None:
-            return jsonify({"error": "Repo nije pronađen u bazi.", "hf_repo_id": hf_repo_id}), 404
-
-       # prikazuje i sve retke s Kaggle koji sadrže navedeni repo
-        rows = conn.execute(
-            """
-            SELECT
-                kaggle_row_id, model_name, provider,
-                context_window, latency_sec, speed_tokens_per_sec,
-                benchmark_mmlu, benchmark_chatbot_arena
-            FROM llm_row
-            WHERE hf_repo_id = ?
-            ORDER BY context_window DESC
-            """,
-            (hf_repo_id,),
-        ).fetchall()
-
-    out = dict(repo)
-    out["kaggle_rows"] = [dict(r) for r in rows]
-    return jsonify(out)
+        repo = conn.execute(repo_query(columns), (hf_repo_id,)).fetchone()
+    if repo is None:
+        return jsonify({"error": "Repo nije pronađen u bazi.", "hf_repo_id": hf_repo_id}), 404
+
+    return jsonify(repo_out(repo))
 
 
 @app.get("/providers/summary")
 def providers_summary():
     with get_conn() as conn:
-        rows = conn.execute(
-            """
-            SELECT
-                provider,
-                COUNT(*) AS n_rows,
-                AVG(context_window) AS avg_context_window,
-                AVG(latency_sec) AS avg_latency_sec,
-                AVG(speed_tokens_per_sec) AS avg_speed_tokens_per_sec,
-                AVG(benchmark_mmlu) AS avg_benchmark_mmlu
-            FROM llm_row
-            GROUP BY provider
-            ORDER BY n_rows DESC
-            """
-        ).fetchall()
+        rows = conn.execute(PROVIDERS_SUMMARY_SQL).fetchall()
 
     return jsonify([dict(r) for r in rows])
 
@@ -130,37 +642,99 @@ def providers_summary():
 @app.get("/repos")
 def repos():
     provider = (request.args.get("provider") or "").strip()
-    limit = request.args.get("limit", "200")
-
     try:
-        limit_i = int(limit)
-        if limit_i <= 0:
-            limit_i = 200
-        limit_i = min(limit_i, 2000)
-    except ValueError:
-        limit_i = 200
-
-    if provider:
-        sql = """
-            SELECT * FROM llm_repo
-            WHERE provider = ?
-            ORDER BY hf_downloads DESC
-            LIMIT ?
-        """
-        params = (provider, limit_i)
+        after = decode_cursor("repos", request.args.get("cursor"))
+        fields = parse_fields(request.args.get("fields"), "llm_repo")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # ključ redoslijeda se čita i kad nije traženo polje, jer iz njega nastaje cursor
+    columns = None if fields is None else list(dict.fromkeys(fields + list(CURSOR_KEYS["repos"])))
+    queries = repos_query(provider, after, columns)
+    if wants_ndjson():
+        return stream_response(queries, parse_stream_limit(request.args.get("limit")), fields)
+    limit_i = parse_limit(request.args.get("limit", "200"))
+    rows = run_engine(
+        queries, limit_i + 1,
+        lambda e: None if after else e.repos.select(provider, limit_i + 1),
+        columns,
+    )
+    return page_response("repos", rows, limit_i, fields)
+
+
+@app.post("/repos/batch")
+def repos_batch():
+    try:
+        ids = parse_batch_ids(str)
+        fields = parse_fields(request.args.get("fields"), "repo_detail", REPO_FIELD_COLUMNS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # hf_repo_id se čita uvijek, jer se po njemu slaže odgovor i popis nepronađenih
+    if fields is None:
+        columns = table_columns("repo_detail")
     else:
-        sql = """
-            SELECT * FROM llm_repo
-            ORDER BY hf_downloads DESC
-            LIMIT ?
-        """
-        params = (limit_i,)
-
+        columns = list(dict.fromkeys(["hf_repo_id"] + [REPO_FIELD_COLUMNS.get(f, f) for f in fields]))
+    sql = batch_query(select_sql("repo_detail", columns), "repo_detail", "hf_repo_id")
     with get_conn() as conn:
-        rows = conn.execute(sql, params).fetchall()
+        found = {r["hf_repo_id"]: r for r in conn.execute(sql, (json.dumps(ids),))}
 
-    return jsonify([dict(r) for r in rows])
+    # isti oblik kao /repo/<id>, redoslijedom iz zahtjeva
+    repos_out = project([repo_out(found[i]) for i in ids if i in found], fields)
+    return jsonify({"repos": repos_out, "missing": [i for i in ids if i not in found]})
+
+
+@app.post("/models/batch")
+def models_batch():
+    try:
+        ids = parse_batch_ids(int)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    sql = batch_query(MODELS_SELECT, "llm_row", "kaggle_row_id")
+    with get_conn() as conn:
+        found = {r["kaggle_row_id"]: dict(r) for r in conn.execute(sql, (json.dumps(ids),))}
+
+    return jsonify({"models": [found[i] for i in ids if i in found], "missing": [i for i in ids if i not in found]})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="REST API nad SQLite bazom.")
+    ap.add_argument("--check-plans", action="store_true",
+                    help="ispiši EXPLAIN QUERY PLAN za svaki upit API-ja i završi s greškom ako ijedan čita cijelu "
+                         "tablicu ili sortira privremenim B-treeom")
+    ap.add_argument("--pool", action="store_true",
+                    help="trajne veze samo za čitanje (mode=ro) iz poola umjesto nove veze po zahtjevu")
+    ap.add_argument("--memory", action="store_true",
+                    help="pri pokretanju kopiraj bazu u memoriju (SQLite backup API) i poslužuj iz kopije; uključuje --pool")
+    ap.add_argument("--engine", choices=ENGINES, default="sql",
+                    help="/models i /repos iz SQL-a, iz NumPy stupaca u memoriji ili oboje uz usporedbu")
+    ap.add_argument("--cache-size", type=int, default=1024,
+                    help="broj gotovih odgovora u LRU cacheu (0 isključuje cache)")
+    ap.add_argument("--watch-interval", type=float, default=1.0,
+                    help="koliko često (s) provjeriti je li 06_store_db.py objavio novu bazu")
+    args = ap.parse_args()
+
+    if args.check_plans:
+        if not os.path.exists(DB_PATH):
+            raise FileNotFoundError(f"Nedostaje {DB_PATH}. Prvo pokreni src/06_store_db.py.")
+        sys.exit(1 if check_plans(DB_PATH) else 0)
+
+    global CACHE, DB, ENGINE
+    ENGINE = args.engine
+    CACHE = ResponseCache(max_entries=args.cache_size) if args.cache_size > 0 else None
+    if args.pool or args.memory:
+        if not os.path.exists(DB_PATH):
+            raise FileNotFoundError(f"Nedostaje {DB_PATH}. Prvo pokreni src/06_store_db.py.")
+        DB = DatabaseSource(DB_PATH, memory=args.memory, watch_interval=args.watch_interval).start()
+    if ENGINE != "sql":
+        # stupci se učitavaju pri pokretanju, ne u prvom zahtjevu
+        with app.app_context():
+            get_engine()
+
+    # reloader bi pokrenuo drugi proces s vlastitom kopijom baze i stupaca
+    app.run(host="127.0.0.1", port=5000, debug=True, use_reloader=DB is None and ENGINE == "sql")
 
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    main()
@@ -0,0 +1,78 @@
+import sqlite3
+from typing import Optional
+
+import numpy as np
+
+# Alternativni put za /models i /repos: tablice se jednom učitaju redoslijedom iz API-ja, a upit
+# postaje raspon u sortiranom nizu. Retci su već gotovi dictovi s istim Python vrijednostima koje
+# vraća sqlite3, pa je JSON isti kao iz SQL-a.
+
+# float64 točno predstavlja cijele brojeve do 2**53; veće granice idu na SQL
+EXACT_INT = 2 ** 53
+
+
+class SortedTable:
+    def __init__(self, rows: list[dict], key_col: Optional[str] = None):
+        self.rows = rows
+        # ključ raste u redoslijedu redaka: -vrijednost za DESC, a NULL (+inf) je na kraju kao u SQLite
+        self.key = None
+        if key_col is not None:
+            self.key = np.array(
+                [np.inf if r[key_col] is None else -float(r[key_col]) for r in rows], dtype=np.float64
+            )
+        # pozicije redaka po provideru, rastuće, pa zadržavaju globalni redoslijed
+        positions: dict[str, list[int]] = {}
+        for i, r in enumerate(rows):
+            if r["provider"] is not None:
+                positions.setdefault(r["provider"], []).append(i)
+        self.by_provider = {p: np.array(pos, dtype=np.int64) for p, pos in positions.items()}
+        self.key_by_provider = {} if self.key is None else {p: self.key[pos] for p, pos in self.by_provider.items()}
+
+    def select(
+        self,
+        provider: str,
+        limit: int,
+        min_value: Optional[int] = None,
+        max_value: Optional[int] = None,
+    ) -> Optional[list[dict]]:
+        if any(v is not None and abs(v) > EXACT_INT for v in (min_value, max_value)):
+            return None
+        pos = None
+        key = self.key
+        n = len(self.rows)
+        if provider:
+            pos = self.by_provider.get(provider)
+            if pos is None:
+                return []
+            key = self.key_by_provider.get(provider)
+            n = len(pos)
+
+        lo, hi = 0, n
+        if key is not None and (min_value is not None or max_value is not None):
+            # raspon [lo, hi) bez NULL-ova, kao "context_window >= ?" / "<= ?" u SQL-u
+            hi = int(np.searchsorted(key, np.inf, "left"))
+            if min_value is not None:
+                hi = min(hi, int(np.searchsorted(key, -float(min_value), "right")))
+            if max_value is not None:
+                lo = int(np.searchsorted(key, -float(max_value), "left"))
+        hi = min(hi, lo + limit)
+        if hi <= lo:
+            return []
+        if pos is None:
+            return self.rows[lo:hi]
+        return [self.rows[i] for i in pos[lo:hi]]
+
+
+class ColumnEngine:
+    def __init__(self, models: SortedTable, repos: SortedTable):
+        self.models = models
+        self.repos = repos
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, models_sql: str, repos_sql: str) -> "ColumnEngine":
+        def fetch(sql: str) -> list[dict]:
+            cur = conn.execute(sql)
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, r)) for r in cur.fetchall()]
+
+        return cls(SortedTable(fetch(models_sql), key_col="context_window"), SortedTable(fetch(repos_sql)))
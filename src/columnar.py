@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# Format: direktorij <ime>.cols/ s manifest.json i jednom binarnom datotekom po stupcu (+ maska za
+# nullable stupce). Datoteke su sirovi nizovi fiksne širine, pa se mogu dopisivati po chunkovima
+# i čitati preko np.memmap bez kopiranja. Tekstualni i kategorijski stupci spremaju se kao int32
+# kodovi, a rječnik vrijednosti je u manifestu.
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+def cols_path(csv_path: str) -> str:
+    root, _ = os.path.splitext(csv_path)
+    return root + ".cols"
+
+
+def _column_kind(s: pd.Series) -> tuple[str, Optional[np.dtype]]:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return "category", np.dtype(np.int32)
+    if isinstance(s.dtype, pd.api.extensions.ExtensionDtype):
+        # nullable Int*/Float*/boolean imaju numpy_dtype vrijednosti i zasebnu masku
+        np_dtype = getattr(s.dtype, "numpy_dtype", None)
+        if np_dtype is not None and s.dtype.kind in "biuf":
+            return "masked", np.dtype(np_dtype)
+        raise TypeError(f"Stupac {s.name!r}: nepodržan tip {s.dtype}")
+    if s.dtype == object:
+        return "object", np.dtype(np.int32)
+    if s.dtype.kind in "biuf":
+        return "numeric", s.dtype
+    raise TypeError(f"Stupac {s.name!r}: nepodržan tip {s.dtype}")
+
+
+class ColumnarWriter:
+    def __init__(self, path: str, meta: Optional[dict] = None):
+        self.path = path
+        self.meta = meta
+        self.tmp = path + ".tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.n_rows = 0
+        self.columns: list[dict] = []
+        self._dicts: dict[str, dict] = {}
+
+    def _file(self, spec: dict, suffix: str = "") -> str:
+        return os.path.join(self.tmp, spec["file"] + suffix)
+
+    def _new_spec(self, name: str, kind: str, dtype: np.dtype, ext_dtype: Optional[str]) -> dict:
+        spec = {"name": name, "kind": kind, "dtype": dtype.str, "file": f"c{len(self.columns)}"}
+        if ext_dtype:
+            spec["ext_dtype"] = ext_dtype
+        if kind in ("category", "object"):
+            spec["categories"] = []
+            self._dicts[name] = {}
+        # stupac koji se pojavi tek u kasnijem chunku popunjava se nedostajućim vrijednostima
+        if self.n_rows:
+            if kind == "numeric":
+                spec["kind"] = kind = "masked"
+                spec["ext_dtype"] = pd.array(np.zeros(0, dtype=dtype)).dtype.name
+            if kind == "masked":
+                np.zeros(self.n_rows, dtype=dtype).tofile(self._file(spec))
+                np.ones(self.n_rows, dtype=np.bool_).tofile(self._file(spec, ".mask"))
+            else:
+                np.full(self.n_rows, -1, dtype=np.int32).tofile(self._file(spec))
+        self.columns.append(spec)
+        return spec
+
+    def _promote(self, spec: dict, kind: str, dtype: np.dtype, ext_dtype: Optional[str]) -> None:
+        # kasniji chunk može imati širi tip (npr. Int8 -> Int64 ili Int -> float); postojeći podaci se prepisuju
+        old = np.dtype(spec["dtype"])
+        target = np.result_type(old, dtype)
+        to_masked = spec["kind"] == "numeric" and kind == "masked"
+        if target != old:
+            np.fromfile(self._file(spec), dtype=old).astype(target).tofile(self._file(spec))
+            spec["dtype"] = target.str
+        if to_masked:
+            np.zeros(self.n_rows, dtype=np.bool_).tofile(self._file(spec, ".mask"))
+            spec["kind"] = "masked"
+        if spec["kind"] == "masked" and (target != old or to_masked):
+            spec["ext_dtype"] = pd.array(np.zeros(0, dtype=target)).dtype.name
+
+    def append(self, df: pd.DataFrame) -> None:
+        by_name = {c["name"]: c for c in self.columns}
+        for name in df.columns:
+            s = df[name]
+            kind, dtype = _column_kind(s)
+            ext_dtype = s.dtype.name if kind == "masked" else None
+            spec = by_name.get(name)
+            if spec is None:
+                spec = self._new_spec(name, kind, dtype, ext_dtype)
+            elif spec["kind"] in ("numeric", "masked") and kind in ("numeric", "masked"):
+                self._promote(spec, kind, dtype, ext_dtype)
+            elif spec["kind"] != kind and {spec["kind"], kind} != {"category", "object"}:
+                raise TypeError(f"Stupac {name!r} mijenja vrstu iz {spec['kind']} u {kind}")
+
+            with open(self._file(spec), "ab") as f:
+                if spec["kind"] in ("category", "object"):
+                    self._encode(spec, s).tofile(f)
+                elif spec["kind"] == "masked":
+                    if kind == "masked":
+                        values = s.to_numpy(dtype=dtype, na_value=0)
+                        mask = s.isna().to_numpy()
+                    else:
+                        values, mask = s.to_numpy(), np.zeros(len(s), dtype=np.bool_)
+                    values.astype(spec["dtype"], copy=False).tofile(f)
+                    with open(self._file(spec, ".mask"), "ab") as fm:
+                        mask.astype(np.bool_, copy=False).tofile(fm)
+                else:
+                    s.to_numpy().astype(spec["dtype"], copy=False).tofile(f)
+
+        for spec in self.columns:
+            if spec["name"] not in df.columns:
+                raise ValueError(f"Chunk nema stupac {spec['name']!r}")
+        self.n_rows += len(df)
+
+    def _encode(self, spec: dict, s: pd.Series) -> np.ndarray:
+        lookup = self._dicts[spec["name"]]
+        codes, uniques = pd.factorize(s.astype(object) if isinstance(s.dtype, pd.CategoricalDtype) else s)
+        remap = np.empty(len(uniques) + 1, dtype=np.int32)
+        remap[-1] = -1
+        for i, v in enumerate(uniques):
+            v = str(v)
+            if v not in lookup:
+                lookup[v] = len(spec["categories"])
+                spec["categories"].append(v)
+            remap[i] = lookup[v]
+        return remap[codes]
+
+    def close(self) -> None:
+        manifest = {"version": FORMAT_VERSION, "n_rows": self.n_rows, "columns": self.columns}
+        if self.meta:
+            manifest["meta"] = self.meta
+        with open(os.path.join(self.tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        old = self.path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(self.tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def write_frame(df: pd.DataFrame, path: str, meta: Optional[dict] = None) -> None:
+    with ColumnarWriter(path, meta=meta) as w:
+        w.append(df)
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: nepoznata verzija formata {manifest.get('version')}")
+    return manifest
+
+
+def _load(path: str, n: int, dtype: np.dtype, mmap: bool, start: int = 0) -> np.ndarray:
+    if n == 0:
+        return np.empty(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r", offset=start * dtype.itemsize, shape=(n,))
+    return np.fromfile(path, dtype=dtype, count=n, offset=start * dtype.itemsize)
+
+
+def read_frame(
+    path: str,
+    columns: Optional[list[str]] = None,
+    mmap: bool = True,
+    start: int = 0,
+    stop: Optional[int] = None,
+) -> pd.DataFrame:
+    manifest = read_manifest(path)
+    # raspon redaka [start, stop) čita se izravno s pomakom u datoteci, bez učitavanja ostatka
+    stop = manifest["n_rows"] if stop is None else min(stop, manifest["n_rows"])
+    start = min(start, stop)
+    n = stop - start
+    specs = {c["name"]: c for c in manifest["columns"]}
+    names = [c["name"] for c in manifest["columns"]] if columns is None else [c for c in columns if c in specs]
+
+    data = {}
+    for name in names:
+        spec = specs[name]
+        dtype = np.dtype(spec["dtype"])
+        values = _load(os.path.join(path, spec["file"]), n, dtype, mmap, start)
+        if spec["kind"] == "numeric":
+            data[name] = pd.Series(values, name=name, copy=False)
+        elif spec["kind"] == "masked":
+            mask = _load(os.path.join(path, spec["file"] + ".mask"), n, np.dtype(np.bool_), mmap, start)
+            array_type = pd.api.types.pandas_dtype(spec["ext_dtype"]).construct_array_type()
+            data[name] = pd.Series(array_type(np.asarray(values), np.asarray(mask)), name=name, copy=False)
+        elif spec["kind"] == "category":
+            data[name] = pd.Series(pd.Categorical.from_codes(np.asarray(values), spec["categories"]), name=name)
+        else:
+            lookup = np.array(spec["categories"] + [np.nan], dtype=object)
+            data[name] = pd.Series(lookup[values], name=name)
+    return pd.DataFrame(data, copy=False)
+
+
+def _prefer_cols(csv_path: str) -> bool:
+    # binarni međurezultat ima prednost ako nije stariji od CSV izvoza
+    manifest = os.path.join(cols_path(csv_path), MANIFEST)
+    return os.path.exists(manifest) and (
+        not os.path.exists(csv_path) or os.path.getmtime(manifest) >= os.path.getmtime(csv_path)
+    )
+
+
+def read_table(csv_path: str, columns: Optional[list[str]] = None, mmap: bool = True) -> pd.DataFrame:
+    if _prefer_cols(csv_path):
+        return read_frame(cols_path(csv_path), columns=columns, mmap=mmap)
+    return pd.read_csv(csv_path, usecols=None if columns is None else (lambda c: c in columns))
+
+
+def iter_table(csv_path: str, chunksize: int, columns: Optional[list[str]] = None) -> Iterator[pd.DataFrame]:
+    if _prefer_cols(csv_path):
+        path = cols_path(csv_path)
+        n_rows = read_manifest(path)["n_rows"]
+        for start in range(0, n_rows, chunksize):
+            yield read_frame(path, columns=columns, mmap=False, start=start, stop=start + chunksize)
+        return
+    yield from pd.read_csv(csv_path, usecols=None if columns is None else (lambda c: c in columns),
+                           chunksize=chunksize)
+
+
+def table_exists(csv_path: str) -> bool:
+    return os.path.exists(csv_path) or os.path.exists(os.path.join(cols_path(csv_path), MANIFEST))
+
+
+def write_table(df: pd.DataFrame, csv_path: str, csv: bool = True) -> None:
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    if csv:
+        df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+    write_frame(df, cols_path(csv_path))
@@ -0,0 +1,45 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Kompresija odgovora API-ja prema Accept-Encoding. brotli nije u requirements.txt; ako je
+# instaliran, ima prednost pred gzipom za gotove odgovore. Stream (NDJSON) se komprimira gzipom
+# dio po dio, pa ni komprimirani izvoz ne drži cijeli odgovor u memoriji.
+
+# manji odgovori stanu u nekoliko paketa i kompresija na njima ne štedi ništa
+MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+
+def available(streamed: bool = False) -> list[str]:
+    if streamed or brotli is None:
+        return ["gzip"]
+    return ["br", "gzip"]
+
+
+def choose_encoding(accept_encodings, streamed: bool = False) -> Optional[str]:
+    # accept_encodings je request.accept_encodings iz Flaska; q=0 isključuje kodiranje; bez Accept-Encoding odgovor ostaje nekomprimiran
+    return accept_encodings.best_match(available(streamed))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    # mtime=0 daje isti izlaz za isto tijelo, pa je ETag komprimirane varijante stabilan
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    if encoding != "gzip":
+        raise ValueError(f"Stream se ne komprimira s {encoding}")
+    # wbits=31 je gzip zaglavlje
+    comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # Z_SYNC_FLUSH šalje svaku seriju odmah, umjesto da čeka da se napuni zlibov međuspremnik
+        yield comp.compress(chunk.encode() if isinstance(chunk, str) else chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+    yield comp.flush()
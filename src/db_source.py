@@ -0,0 +1,121 @@
+import os
+import queue
+import sqlite3
+import threading
+from typing import Optional
+
+# Izvor veza za 07_api.py kad se ne otvara nova veza po zahtjevu. Veze su samo za čitanje i
+# vraćaju se u pool nakon zahtjeva; svaka nosi generaciju baze. Kad 06_store_db.py objavi novu
+# bazu (os.replace mijenja inode, --upsert mijenja mtime/veličinu), watcher poveća generaciju:
+# novi zahtjevi dobivaju veze na novu bazu, a zahtjevi u tijeku dovršavaju na staroj.
+# Na Windowsima otvorena datoteka ne može biti zamijenjena (SQLite je ne otvara s FILE_SHARE_DELETE),
+# pa dok 06_store_db.py gradi novu bazu (postoji <baza>.tmp) pool ne drži slobodne veze otvorene.
+
+
+class DatabaseSource:
+    def __init__(self, path: str, memory: bool = False, pool_size: int = 16, watch_interval: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.memory = memory
+        self.pool_size = pool_size
+        self.watch_interval = watch_interval
+        self._pool: queue.LifoQueue = queue.LifoQueue()
+        self._reload_lock = threading.Lock()
+        self._anchor: Optional[sqlite3.Connection] = None
+        self._retired: Optional[sqlite3.Connection] = None
+        # (generacija, URI, stat datoteke) se zamjenjuje jednom dodjelom, pa čitanje ne treba lock
+        self._current: tuple[int, str, tuple] = (0, "", ())
+        # True dok 06_store_db.py gradi novu bazu; tada se veze zatvaraju umjesto vraćanja u pool
+        self._draining = False
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._load()
+
+    def _stat(self) -> tuple:
+        st = os.stat(self.path)
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _load(self) -> None:
+        stamp = self._stat()
+        generation = self._current[0] + 1
+        uri = f"file:{self.path}?mode=ro"
+        anchor = None
+        if self.memory:
+            # kopija cijele baze u dijeljenu memorijsku bazu; sidro je drži živom dok je generacija aktualna
+            uri = f"file:llm_context_{id(self)}_{generation}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            src = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                src.backup(anchor)
+            finally:
+                src.close()
+        # memorijska baza živi dok god je otvorena ijedna veza, pa zahtjevi u tijeku ne gube podatke;
+        # sidro prethodne generacije ostaje do sljedeće zamjene za zahtjev koji je upravo pročitao stari URI
+        if self._retired is not None:
+            self._retired.close()
+        self._retired, self._anchor = self._anchor, anchor
+        self._current = (generation, uri, stamp)
+
+    def refresh(self) -> bool:
+        with self._reload_lock:
+            if self._stat() == self._current[2]:
+                return False
+            self._load()
+            return True
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                _, conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.watch_interval):
+            self._draining = os.path.exists(self.path + ".tmp")
+            if self._draining:
+                self._drain()
+            try:
+                if self.refresh():
+                    print(f"Baza {self.path} je promijenjena; generacija {self._current[0]}")
+            except (OSError, sqlite3.Error) as e:
+                # npr. baza trenutno ne postoji; zadržava se zadnja ispravna generacija
+                print(f"Osvježavanje baze nije uspjelo: {e}")
+
+    def start(self) -> "DatabaseSource":
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="db-watch", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def generation(self) -> int:
+        return self._current[0]
+
+    def acquire(self) -> tuple[int, sqlite3.Connection]:
+        generation, uri, _ = self._current
+        while True:
+            try:
+                gen, conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if gen == generation:
+                return gen, conn
+            conn.close()
+        # Flask može posluživati svaki zahtjev u drugoj dretvi, pa veza nije vezana uz dretvu
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.memory:
+            # memorijska baza nema mode=ro
+            conn.execute("PRAGMA query_only = ON")
+        return generation, conn
+
+    def release(self, item: tuple[int, sqlite3.Connection]) -> None:
+        gen, conn = item
+        if gen == self._current[0] and not self._draining and self._pool.qsize() < self.pool_size:
+            self._pool.put(item)
+        else:
+            conn.close()
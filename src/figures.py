@@ -0,0 +1,330 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+# mijenja se kad se promijeni izgled grafova, pa se svi ponovno iscrtaju
+RENDER_VERSION = 1
+STATE_FILE = ".render_state.json"
+DPI = 200
+
+# iznad ovoliko točaka scatter i histogram crtaju se iz unaprijed agregirane mreže
+BINNED_THRESHOLD = 50_000
+GRID = (200, 150)
+HIST_BINS = 25
+
+
+def as_float(s: pd.Series) -> pd.Series:
+    # nullable Int/Float stupce matplotlib ne prima izravno; float32 ostaje float32
+    s = pd.to_numeric(s, errors="coerce")
+    return s if s.dtype in (np.float32, np.float64) else s.astype("float64")
+
+
+def _new_figure() -> tuple[Figure, object]:
+    # objektni API bez globalnog pyplot stanja, pa se grafovi mogu crtati paralelno
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _save(fig: Figure, fig_dir: str, filename: str) -> bool:
+    fig.tight_layout()
+    fig.savefig(os.path.join(fig_dir, filename), dpi=DPI)
+    return True
+
+
+def _axis_bins(v: np.ndarray, n: int, log: bool) -> tuple[np.ndarray, np.ndarray]:
+    # indeks binova u linearnom ili log10 prostoru; rubovi se vraćaju u izvornim jedinicama
+    t = np.log10(v) if log else v
+    lo, hi = float(t.min()), float(t.max())
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    idx = np.minimum(((t - lo) * (n / (hi - lo))).astype(np.int64), n - 1)
+    edges = np.linspace(lo, hi, n + 1)
+    return idx, (10 ** edges if log else edges)
+
+
+def bin2d(x: np.ndarray, y: np.ndarray, logx: bool, logy: bool, grid: tuple[int, int] = GRID):
+    # točke koje na log osi nemaju položaj ne ulaze u mrežu, kao ni kod ax.scatter
+    keep = np.ones(len(x), dtype=bool)
+    if logx:
+        keep &= x > 0
+    if logy:
+        keep &= y > 0
+    x, y = x[keep], y[keep]
+    nx, ny = grid
+    if len(x) == 0:
+        return None
+    ix, xedges = _axis_bins(x, nx, logx)
+    iy, yedges = _axis_bins(y, ny, logy)
+    counts = np.bincount(ix * ny + iy, minlength=nx * ny).reshape(nx, ny)
+    return counts, xedges, yedges
+
+
+def _binned_scatter(ax, fig: Figure, x: np.ndarray, y: np.ndarray, logx: bool, logy: bool) -> None:
+    binned = bin2d(x, y, logx, logy)
+    if binned is None:
+        return
+    counts, xedges, yedges = binned
+    density = np.ma.masked_equal(counts.T, 0)
+    mesh = ax.pcolormesh(xedges, yedges, density, norm=LogNorm(vmin=1, vmax=max(int(counts.max()), 1)), cmap="viridis")
+    fig.colorbar(mesh, ax=ax, label="broj točaka")
+
+
+def save_scatter(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    title: str,
+    xlabel: str,
+    ylabel: str,
+    filename: str,
+    logx: bool = False,
+    logy: bool = False,
+    fig_dir: str = "reports/figures",
+    binned_threshold: int = BINNED_THRESHOLD,
+) -> bool:
+    if x not in df.columns or y not in df.columns:
+        return False
+
+    tmp = df[[x, y]].copy()
+    tmp[x] = as_float(tmp[x])
+    tmp[y] = as_float(tmp[y])
+    tmp = tmp.dropna()
+
+    if tmp.empty:
+        return False
+
+    fig, ax = _new_figure()
+    if len(tmp) > binned_threshold:
+        _binned_scatter(ax, fig, tmp[x].to_numpy(), tmp[y].to_numpy(), logx, logy)
+    else:
+        ax.scatter(tmp[x], tmp[y], alpha=0.7)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+    if logx:
+        ax.set_xscale("log")
+    if logy:
+        ax.set_yscale("log")
+
+    return _save(fig, fig_dir, filename)
+
+
+def binned_hist(groups: pd.Series, values: pd.Series, order: list[str], bins: int = HIST_BINS, log: bool = False):
+    # za svaku grupu jednaki razmaci od min do max (kao ax.hist(vals, bins)), ali jednim bincountom;
+    # uz log=True razmaci su jednaki u log10 prostoru, pa se na log osi ne slijevaju u jedan stupac
+    codes = pd.Categorical(groups, categories=order).codes.astype(np.int64)
+    v = values.to_numpy(dtype=np.float64)
+    keep = codes >= 0
+    if log:
+        keep &= v > 0
+    codes, v = codes[keep], v[keep]
+    if log:
+        v = np.log10(v)
+    lo = np.full(len(order), np.inf)
+    hi = np.full(len(order), -np.inf)
+    np.minimum.at(lo, codes, v)
+    np.maximum.at(hi, codes, v)
+    width = np.where(hi > lo, hi - lo, 1.0)
+    base = np.where(hi > lo, lo, lo - 0.5)
+    idx = np.clip(((v - base[codes]) * (bins / width[codes])).astype(np.int64), 0, bins - 1)
+    counts = np.bincount(codes * bins + idx, minlength=len(order) * bins).reshape(len(order), bins)
+    for i, p in enumerate(order):
+        if counts[i].sum():
+            edges = np.linspace(base[i], base[i] + width[i], bins + 1)
+            yield p, counts[i], (10 ** edges if log else edges)
+
+
+def save_hist_by_provider(
+    df: pd.DataFrame,
+    value_col: str,
+    provider_col: str,
+    title: str,
+    xlabel: str,
+    filename: str,
+    max_providers: int = 8,
+    fig_dir: str = "reports/figures",
+    binned_threshold: int = BINNED_THRESHOLD,
+) -> bool:
+    if value_col not in df.columns or provider_col not in df.columns:
+        return False
+
+    tmp = df[[provider_col, value_col]].copy()
+    tmp[value_col] = as_float(tmp[value_col])
+    # strip po jedinstvenoj vrijednosti umjesto po retku; NaN postaje "nan" kao kod astype(str)
+    codes, uniques = pd.factorize(tmp[provider_col])
+    labels = np.append(pd.Index(uniques).astype(str).str.strip().to_numpy(dtype=object), "nan")
+    tmp[provider_col] = labels[codes]
+    tmp = tmp.dropna(subset=[value_col])
+    if tmp.empty:
+        return False
+
+    counts = tmp[provider_col].value_counts()
+    providers = counts.head(max_providers).index.tolist()
+    tmp = tmp[tmp[provider_col].isin(providers)].copy()
+
+    fig, ax = _new_figure()
+    if len(tmp) > binned_threshold:
+        for p, hist, edges in binned_hist(tmp[provider_col], tmp[value_col], providers, log=True):
+            ax.stairs(hist, edges, fill=True, alpha=0.5, label=p)
+    else:
+        for p in providers:
+            vals = tmp.loc[tmp[provider_col] == p, value_col].dropna().values
+            if len(vals) > 0:
+                ax.hist(vals, bins=HIST_BINS, alpha=0.5, label=p)
+
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Frekvencija")
+    ax.set_xscale("log")
+    ax.legend()
+    return _save(fig, fig_dir, filename)
+
+
+def save_corr_heatmap(
+    df: pd.DataFrame,
+    cols: list[str],
+    title: str,
+    filename: str,
+    fig_dir: str = "reports/figures",
+) -> bool:
+    usable = [c for c in cols if c in df.columns]
+    if len(usable) < 2:
+        return False
+
+    tmp = df[usable].copy()
+    for c in usable:
+        tmp[c] = as_float(tmp[c])
+    tmp = tmp.dropna()
+    if tmp.empty:
+        return False
+
+    return save_corr_matrix(tmp.corr(numeric_only=True), title, filename, fig_dir)
+
+
+def save_corr_matrix(
+    df: pd.DataFrame,
+    title: str,
+    filename: str,
+    fig_dir: str = "reports/figures",
+    cols: Optional[list[str]] = None,
+) -> bool:
+    # već izračunata korelacijska matrica (npr. iz sketches.CoMoments) s nazivima stupaca i u indeksu
+    usable = [c for c in (df.columns if cols is None else cols) if c in df.columns and c in df.index]
+    if len(usable) < 2:
+        return False
+    corr = df.loc[usable, usable]
+
+    fig, ax = _new_figure()
+    im = ax.imshow(corr.values, aspect="auto")
+    ax.set_title(title)
+    ax.set_xticks(range(len(usable)), usable, rotation=45, ha="right")
+    ax.set_yticks(range(len(usable)), usable)
+    fig.colorbar(im, ax=ax)
+    return _save(fig, fig_dir, filename)
+
+
+RENDERERS = {
+    "scatter": (save_scatter, lambda kw: [kw["x"], kw["y"]]),
+    "hist_by_provider": (save_hist_by_provider, lambda kw: [kw["provider_col"], kw["value_col"]]),
+    "corr_heatmap": (save_corr_heatmap, lambda kw: list(kw["cols"])),
+    "corr_matrix": (save_corr_matrix, lambda kw: list(kw["cols"])),
+}
+
+
+def job_data(job: dict, frames: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    df = frames[job["frame"]]
+    _, columns = RENDERERS[job["kind"]]
+    return df[[c for c in dict.fromkeys(columns(job["params"])) if c in df.columns]]
+
+
+def job_hash(job: dict, data: pd.DataFrame) -> str:
+    # otisak ulaznih stupaca i parametara; isti otisak i postojeća datoteka znače da se graf ne crta ponovno
+    h = hashlib.sha256()
+    h.update(json.dumps({"v": RENDER_VERSION, "dpi": DPI, "job": job}, sort_keys=True).encode())
+    h.update(json.dumps({c: str(t) for c, t in data.dtypes.items()}).encode())
+    h.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def render_job(job: dict, data: pd.DataFrame, fig_dir: str) -> bool:
+    # renderer vraća je li spremio graf; kad odustane, na disku može ostati stari PNG koji ne odgovara otisku
+    fn, _ = RENDERERS[job["kind"]]
+    return fn(df=data, fig_dir=fig_dir, **job["params"])
+
+
+def load_render_state(fig_dir: str) -> dict:
+    path = os.path.join(fig_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_render_state(fig_dir: str, state: dict) -> None:
+    path = os.path.join(fig_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def render_figures(
+    jobs: list[dict],
+    frames: dict[str, pd.DataFrame],
+    fig_dir: str,
+    workers: Optional[int] = None,
+    force: bool = False,
+    binned_threshold: Optional[int] = None,
+) -> tuple[list[str], list[str]]:
+    os.makedirs(fig_dir, exist_ok=True)
+    state = load_render_state(fig_dir)
+
+    if binned_threshold is not None:
+        # prag ide u parametre posla, pa ulazi u otisak i stiže do procesa koji crta
+        jobs = [
+            {**job, "params": {**job["params"], "binned_threshold": binned_threshold}}
+            if job["kind"] in ("scatter", "hist_by_provider") else job
+            for job in jobs
+        ]
+
+    todo, skipped = [], []
+    for job in jobs:
+        filename = job["params"]["filename"]
+        data = job_data(job, frames)
+        digest = job_hash(job, data)
+        if not force and state.get(filename) == digest and os.path.exists(os.path.join(fig_dir, filename)):
+            skipped.append(filename)
+        else:
+            todo.append((job, data, digest))
+
+    workers = min(len(todo), workers or os.cpu_count() or 1)
+    if workers > 1:
+        # svaki graf u svom procesu; ukupno trajanje je trajanje najsporijeg grafa
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_job, *zip(*[(job, data, fig_dir) for job, data, _ in todo])))
+    else:
+        results = [render_job(job, data, fig_dir) for job, data, _ in todo]
+
+    rendered = []
+    for (job, _, digest), ok in zip(todo, results):
+        filename = job["params"]["filename"]
+        if ok:
+            state[filename] = digest
+            rendered.append(filename)
+        else:
+            state.pop(filename, None)
+    save_render_state(fig_dir, state)
+    return rendered, skipped
@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+
+class MetricsCache:
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS hf_metrics (
+                hf_repo_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                etag TEXT,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM hf_metrics").fetchone()[0]
+
+    def __contains__(self, repo_id: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM hf_metrics WHERE hf_repo_id = ?", (repo_id,)
+        ).fetchone() is not None
+
+    def seed_from_json(self, json_path: str) -> int:
+        # jednokratni uvoz starog JSON cachea; vrijeme dohvata procjenjuje se iz mtime datoteke
+        if len(self) > 0 or not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        fetched_at = os.path.getmtime(json_path)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO hf_metrics (hf_repo_id, payload, etag, fetched_at) VALUES (?, ?, NULL, ?)",
+                [(rid, json.dumps(obj, ensure_ascii=False), fetched_at) for rid, obj in data.items()],
+            )
+        return len(data)
+
+    def get(self, repo_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT payload FROM hf_metrics WHERE hf_repo_id = ?", (repo_id,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def etag(self, repo_id: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT etag FROM hf_metrics WHERE hf_repo_id = ?", (repo_id,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def is_fresh(self, repo_id: str, now: Optional[float] = None) -> bool:
+        row = self.conn.execute(
+            "SELECT fetched_at FROM hf_metrics WHERE hf_repo_id = ?", (repo_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        if self.ttl_seconds is None:
+            return True
+        return (now or time.time()) - row[0] < self.ttl_seconds
+
+    def put(self, repo_id: str, payload: Dict[str, Any], etag: Optional[str] = None) -> None:
+        # ON CONFLICT zadržava rowid, pa izvoz ostaje u redoslijedu prvog upisa
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO hf_metrics (hf_repo_id, payload, etag, fetched_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(hf_repo_id) DO UPDATE SET
+                    payload = excluded.payload, etag = excluded.etag, fetched_at = excluded.fetched_at
+                """,
+                (repo_id, json.dumps(payload, ensure_ascii=False), etag, time.time()),
+            )
+
+    def touch(self, repo_id: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "UPDATE hf_metrics SET fetched_at = ? WHERE hf_repo_id = ?", (time.time(), repo_id)
+            )
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        rows = self.conn.execute("SELECT hf_repo_id, payload FROM hf_metrics ORDER BY rowid")
+        return {rid: json.loads(payload) for rid, payload in rows}
@@ -0,0 +1,101 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# HF_ENDPOINT omogućuje preusmjeravanje na lokalni stub server (testovi, CI)
+HF_ENDPOINT = os.environ.get("HF_ENDPOINT", "https://huggingface.co").rstrip("/")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._last) * self.rate)
+                self._last = max(self._last, now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate + max(0.0, self._last - now)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        # 429 vrijedi za cijeli klijent, pa zaustavlja sve dretve, ne samo onu koja ga je dobila
+        with self._lock:
+            self._tokens = 0.0
+            self._last = max(self._last, time.monotonic() + seconds)
+
+
+def make_session(pool_size: int = 8) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_with_retry(
+    session: requests.Session,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    limiter: Optional[TokenBucket] = None,
+    max_retries: int = 5,
+    backoff: float = 1.0,
+    timeout: float = 60,
+) -> requests.Response:
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            r = session.get(url, params=params, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= max_retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+            attempt += 1
+            continue
+
+        if r.status_code not in RETRY_STATUSES or attempt >= max_retries:
+            return r
+
+        delay = retry_after_seconds(r)
+        if delay is None:
+            delay = backoff * (2 ** attempt) + random.uniform(0, backoff)
+        if r.status_code == 429 and limiter is not None:
+            limiter.pause(delay)
+        else:
+            time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,145 @@
+import re
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+NGRAM = 3
+MAX_POSTINGS = 20000
+
+
+def normalize_name(name: str) -> str:
+    # ime repozitorija bez organizacije, npr. "meta-llama/Llama-3.1-8B" -> "llama-3.1-8b"
+    return str(name).strip().split("/")[-1].lower()
+
+
+def name_features(name: str, n: int = NGRAM) -> set[str]:
+    padded = f" {name} "
+    grams = {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+    # tokeni odvajaju slova od brojeva, pa "8b" daje "8" i "b"
+    tokens = {"t:" + t for t in re.findall(r"[a-z]+|\d+", name)}
+    return grams | tokens
+
+
+class RepoMatcher:
+    def __init__(self, repo_ids: list[str], popularity: Optional[Iterable] = None, n: int = NGRAM):
+        self.n = n
+        self.repo_ids = np.array(repo_ids, dtype=object)
+        size = len(self.repo_ids)
+        self.popularity = (
+            np.zeros(size, dtype=np.float64) if popularity is None
+            else np.nan_to_num(np.array(list(popularity), dtype=np.float64))
+        )
+
+        orgs = [rid.split("/")[0] + "/" if "/" in rid else "" for rid in repo_ids]
+        self.org_codes = {org: i for i, org in enumerate(dict.fromkeys(orgs))}
+        self.repo_org = np.fromiter((self.org_codes[o] for o in orgs), dtype=np.int32, count=size)
+
+        vocab: dict[str, int] = {}
+        feat_ids, repo_idx = [], []
+        for i, rid in enumerate(repo_ids):
+            for f in name_features(normalize_name(rid), n):
+                feat_ids.append(vocab.setdefault(f, len(vocab)))
+                repo_idx.append(i)
+        self.vocab = vocab
+        self.is_token = np.fromiter((f.startswith("t:") for f in vocab), dtype=bool, count=len(vocab))
+
+        feat_ids = np.array(feat_ids, dtype=np.int64)
+        repo_idx = np.array(repo_idx, dtype=np.int32)
+
+        # postings su složeni po (značajka, organizacija), pa je svaki takav par jedan kontinuirani odsječak
+        self.n_orgs = max(1, len(self.org_codes))
+        keys = feat_ids * self.n_orgs + self.repo_org[repo_idx]
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.postings = repo_idx[order]
+        self.df = np.bincount(feat_ids, minlength=len(vocab))
+        self.idf = np.log1p(size / np.maximum(self.df, 1))
+        self.repo_weight = np.bincount(repo_idx, weights=self.idf[feat_ids], minlength=size)
+
+    @classmethod
+    def from_catalogue(cls, cat, n: int = NGRAM) -> "RepoMatcher":
+        return cls([r[0] for r in cat.rows], [r[2] or 0 for r in cat.rows], n=n)
+
+    def __len__(self) -> int:
+        return len(self.repo_ids)
+
+    def top_k(self, model_name: str, prefixes: Iterable[str] = (), k: int = 10) -> list[tuple[str, float]]:
+        qf = [self.vocab[f] for f in name_features(normalize_name(model_name), self.n) if f in self.vocab]
+        if not qf:
+            return []
+        qf = np.array(qf, dtype=np.int64)
+        q_weight = self.idf[qf].sum()
+
+        prefixes = list(prefixes)
+        if prefixes:
+            orgs = np.array([self.org_codes[p] for p in prefixes if p in self.org_codes], dtype=np.int64)
+            if len(orgs) == 0:
+                return []
+            lo_keys = (qf[:, None] * self.n_orgs + orgs[None, :]).ravel()
+            hi_keys = lo_keys + 1
+            feat = np.repeat(qf, len(orgs))
+        else:
+            # bez filtra po organizaciji trigrami se uzimaju od najrjeđeg dok ne popune budžet postings lista;
+            # tokeni imena ostaju uvijek, jer su često najčešće značajke upita i rez bi ih izbacio prve
+            grams = qf[~self.is_token[qf]]
+            grams = grams[np.argsort(self.df[grams], kind="stable")]
+            cost = np.cumsum(self.df[grams])
+            if len(grams):
+                grams = grams[cost <= max(MAX_POSTINGS, cost[0])]
+            qf = np.concatenate([qf[self.is_token[qf]], grams])
+            lo_keys = qf * self.n_orgs
+            hi_keys = lo_keys + self.n_orgs
+            feat = qf
+
+        lo = np.searchsorted(self.keys, lo_keys, side="left")
+        hi = np.searchsorted(self.keys, hi_keys, side="left")
+        hits = np.concatenate([self.postings[a:b] for a, b in zip(lo, hi)])
+        if len(hits) == 0:
+            return []
+        cand, inv = np.unique(hits, return_inverse=True)
+        common = np.bincount(inv, weights=np.repeat(self.idf[feat], hi - lo))
+
+        # Dice sličnost nad idf težinama značajki
+        score = 2.0 * common / (q_weight + self.repo_weight[cand])
+        if len(cand) > k:
+            # svi s rezultatom k-tog mjesta ostaju u izboru, jer argpartition izjednačene na granici
+            # bira proizvoljno; poredak ispod je potpun (rezultat, popularnost, indeks repoa iz np.unique)
+            kth = np.partition(score, len(score) - k)[len(score) - k]
+            keep = score >= kth
+            cand, score = cand[keep], score[keep]
+        order = np.lexsort((-self.popularity[cand], -score))[:k]
+        return [(self.repo_ids[i], float(s)) for i, s in zip(cand[order], score[order])]
+
+
+def match_candidates(
+    rows: Iterable[tuple[int, str, str]],
+    matcher: RepoMatcher,
+    cat,
+    prefixes_for: Callable[[str], list[str]],
+    closed: set[str],
+    k: int = 10,
+) -> dict[str, dict]:
+    out = {}
+    for row_id, model_name, provider in rows:
+        rec = {
+            "kaggle_row_id": int(row_id),
+            "model_name": model_name,
+            "provider": provider,
+            "query": None,
+            "candidates": [],
+        }
+        if str(provider).strip().lower() in closed:
+            rec["note"] = "closed_source_provider_skipped"
+        else:
+            rec["query"] = normalize_name(model_name)
+            for rid, score in matcher.top_k(model_name, prefixes_for(provider), k=k):
+                m = cat.metrics(rid)
+                rec["candidates"].append({
+                    "id": rid,
+                    "likes": m["hf_likes"],
+                    "downloads": m["hf_downloads"],
+                    "downloadsAllTime": m["hf_downloads_all_time"],
+                    "match_score": round(score, 4),
+                })
+        out[str(row_id)] = rec
+    return out
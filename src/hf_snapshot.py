@@ -0,0 +1,146 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+
+from hf_client import HF_ENDPOINT, TokenBucket, get_with_retry, make_session
+
+SNAPSHOT_PATH = "data/raw/hf_catalogue_snapshot.json.gz"
+
+# organizacije iz provider_prefixes() u 03/04
+SNAPSHOT_AUTHORS = ["meta-llama", "deepseek-ai", "mistralai", "CohereLabs", "CohereForAI", "Cohere"]
+
+COLUMNS = ["id", "likes", "downloads", "downloadsAllTime"]
+
+
+class Catalogue:
+    def __init__(self, rows: list[list], meta: Optional[Dict[str, Any]] = None):
+        # sortirano po downloads silazno, kao i HF pretraga sa sort=downloads
+        self.rows = sorted(rows, key=lambda r: -(r[2] or 0))
+        self.meta = meta or {}
+        self._lower = [str(r[0]).lower() for r in self.rows]
+        self._by_id = {r[0]: r for r in self.rows}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def ids(self) -> list[str]:
+        return [r[0] for r in self.rows]
+
+    def search(self, query: str, limit: int = 50) -> list[dict]:
+        # približava HF `search`: svi dijelovi upita moraju se pojaviti u id-u (bez obzira na velika slova)
+        terms = [t for t in re.split(r"[\s\-_/]+", str(query).lower()) if t]
+        out = []
+        for r, low in zip(self.rows, self._lower):
+            if all(t in low for t in terms):
+                out.append(dict(zip(COLUMNS, r)))
+                if len(out) >= limit:
+                    break
+        return out
+
+    def metrics(self, repo_id: str) -> Dict[str, Any]:
+        r = self._by_id.get(repo_id)
+        if r is None:
+            return {
+                "hf_repo_id": repo_id,
+                "hf_status": "not_in_snapshot",
+                "hf_likes": None,
+                "hf_downloads": None,
+                "hf_downloads_all_time": None,
+            }
+        return {
+            "hf_repo_id": repo_id,
+            "hf_status": "ok",
+            "hf_likes": r[1],
+            "hf_downloads": r[2],
+            "hf_downloads_all_time": r[3],
+        }
+
+
+def fetch_author_models(author: str, session, limiter, page_size: int = 1000) -> list[list]:
+    url = f"{HF_ENDPOINT}/api/models"
+    params = {
+        "author": author,
+        "limit": page_size,
+        "expand[]": ["downloads", "downloadsAllTime", "likes"],
+    }
+    rows = []
+    while url:
+        r = get_with_retry(session, url, params=params, limiter=limiter)
+        r.raise_for_status()
+        for it in r.json():
+            rows.append([it.get("id"), it.get("likes"), it.get("downloads"), it.get("downloadsAllTime")])
+        # HF listing straniči preko Link zaglavlja; sljedeći URL već sadrži sve parametre
+        url = r.links.get("next", {}).get("url")
+        params = None
+    return rows
+
+
+def build_snapshot(authors: list[str], rate: float = 5.0) -> Catalogue:
+    session = make_session(1)
+    limiter = TokenBucket(rate)
+    rows = []
+    for author in authors:
+        got = fetch_author_models(author, session, limiter)
+        print("Author:", author, "models=", len(got))
+        rows.extend(got)
+    return Catalogue(rows, {"source": HF_ENDPOINT, "authors": authors})
+
+
+def snapshot_from_cache(candidates_json: str, metrics_json: str) -> Catalogue:
+    # fixture za offline/CI: katalog složen od već dohvaćenih kandidata i metrika
+    rows = {}
+    with open(candidates_json, "r", encoding="utf-8") as f:
+        for rec in json.load(f).values():
+            for c in rec.get("candidates", []):
+                if c.get("id"):
+                    rows[c["id"]] = [c["id"], c.get("likes"), c.get("downloads"), c.get("downloadsAllTime")]
+    if os.path.exists(metrics_json):
+        with open(metrics_json, "r", encoding="utf-8") as f:
+            for rid, m in json.load(f).items():
+                if m.get("hf_status") == "ok":
+                    rows[rid] = [rid, m.get("hf_likes"), m.get("hf_downloads"), m.get("hf_downloads_all_time")]
+    return Catalogue(list(rows.values()), {"source": "cache", "authors": SNAPSHOT_AUTHORS})
+
+
+def save_snapshot(cat: Catalogue, path: str = SNAPSHOT_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    obj = dict(cat.meta, created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), columns=COLUMNS, rows=cat.rows)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> Catalogue:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Nedostaje {path}. Prvo pokreni src/hf_snapshot.py.")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        obj = json.load(f)
+    if obj.get("columns") != COLUMNS:
+        raise ValueError(f"Neočekivani format snapshota: {obj.get('columns')}")
+    rows = obj.pop("rows")
+    return Catalogue(rows, obj)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lokalni snapshot HF kataloga za offline rad stageova 03 i 04.")
+    ap.add_argument("--out", default=SNAPSHOT_PATH)
+    ap.add_argument("--rate", type=float, default=5.0)
+    ap.add_argument("--from-cache", action="store_true",
+                    help="složi snapshot iz postojećih hf_candidates_by_row.json i hf_metrics_by_repo.json (bez mreže)")
+    args = ap.parse_args()
+
+    if args.from_cache:
+        cat = snapshot_from_cache("data/raw/hf_candidates_by_row.json", "data/raw/hf_metrics_by_repo.json")
+    else:
+        cat = build_snapshot(SNAPSHOT_AUTHORS, rate=args.rate)
+    save_snapshot(cat, args.out)
+    print("Saved:", args.out, "models=", len(cat))
+
+
+if __name__ == "__main__":
+    main()
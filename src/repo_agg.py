@@ -0,0 +1,134 @@
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from columnar import cols_path, read_frame, read_manifest, write_frame
+
+# Ponovni izračun samo dotaknutih grupa, ne spojivo stanje po repou: spremaju se samo otisci redaka,
+# a dotaknuti repoi se ponovno grupiraju iz cijelog row-level framea (medijan treba sve vrijednosti grupe,
+# a redak može nestati ili prijeći u drugi repo). Row-level frame je ionako u memoriji jer ga 04 gradi
+# svaki put, a repo-level CSV se zapisuje cijeli. Ušteda je u groupby-ju nad nedotaknutim repoima.
+
+# mijenja se kad se promijeni način agregacije; stanje starije verzije znači puni izračun
+AGG_VERSION = 1
+KEY = "hf_repo_id"
+
+# (izlazni stupac, ulazni stupac, agregacija); sve su ugrađene groupby agregacije bez Python callbacka
+AGGREGATIONS = [
+    ("n_kaggle_rows", "kaggle_row_id", "count"),
+    ("context_window", "context_window", "max"),
+    ("speed_tokens_per_sec", "speed_tokens_per_sec", "median"),
+    ("latency_sec", "latency_sec", "median"),
+    ("benchmark_mmlu", "benchmark_mmlu", "median"),
+    ("benchmark_chatbot_arena", "benchmark_chatbot_arena", "median"),
+    ("open_source", "open_source", "max"),
+    ("price_per_million_tokens", "price_per_million_tokens", "median"),
+    ("training_dataset_size", "training_dataset_size", "median"),
+    ("compute_power", "compute_power", "median"),
+    ("energy_efficiency", "energy_efficiency", "median"),
+    ("quality_rating", "quality_rating", "median"),
+    ("speed_rating", "speed_rating", "median"),
+    ("price_rating", "price_rating", "median"),
+    ("hf_status", "hf_status", "first"),
+    ("hf_likes", "hf_likes", "max"),
+    ("hf_downloads", "hf_downloads", "max"),
+    ("hf_downloads_all_time", "hf_downloads_all_time", "max"),
+]
+SOURCE_COLS = ["provider"] + [src for _, src, _ in AGGREGATIONS]
+
+
+def group_mode(df: pd.DataFrame, col: str, key: str = KEY) -> pd.Series:
+    # najčešća vrijednost po grupi; kod izjednačenja najmanja vrijednost, kao Series.mode().iloc[0]
+    sub = df[[key, col]].dropna(subset=[col])
+    counts = (
+        pd.DataFrame({key: sub[key].astype(str), col: sub[col].astype(str)})
+        .groupby([key, col], sort=False)
+        .size()
+        .reset_index(name="n")
+    )
+    counts = counts.sort_values([key, "n", col], ascending=[True, False, True], kind="mergesort")
+    return counts.drop_duplicates(key).set_index(key)[col]
+
+
+def aggregate_repos(merged: pd.DataFrame) -> pd.DataFrame:
+    cols = [(out, src, fn) for out, src, fn in AGGREGATIONS if src in merged.columns]
+    out = (
+        merged
+        .groupby(KEY, as_index=False, observed=True)
+        .agg(**{name: (src, fn) for name, src, fn in cols})
+    )
+    # repo bez ijedne poznate vrijednosti providera dobiva NaN, kao i s.iloc[0] u staroj lambdi
+    out.insert(1, "provider", out[KEY].astype(str).map(group_mode(merged, "provider")))
+    return out
+
+
+def row_fingerprints(merged: pd.DataFrame) -> pd.DataFrame:
+    cols = [c for c in dict.fromkeys(SOURCE_COLS) if c in merged.columns and c != "kaggle_row_id"]
+    # numerički stupci se hashiraju kao float64, pa sužavanje tipa (Int16 -> Int32) ne mijenja otisak
+    norm = pd.DataFrame({
+        c: (merged[c].astype("float64") if pd.api.types.is_numeric_dtype(merged[c]) else merged[c].astype(str))
+        for c in cols
+    })
+    return pd.DataFrame({
+        "kaggle_row_id": merged["kaggle_row_id"].astype("int64").to_numpy(),
+        KEY: merged[KEY].astype(str).to_numpy(dtype=object),
+        "row_hash": pd.util.hash_pandas_object(norm, index=False).to_numpy(),
+    })
+
+
+def touched_repos(prev_fp: pd.DataFrame, cur_fp: pd.DataFrame) -> set[str]:
+    both = prev_fp.merge(cur_fp, on="kaggle_row_id", how="outer", suffixes=("_prev", ""), indicator=True)
+    changed = (
+        (both["_merge"] != "both")
+        | (both[KEY + "_prev"] != both[KEY])
+        | (both["row_hash_prev"] != both["row_hash"])
+    )
+    # redak koji prelazi u drugi repo mijenja i stari i novi repo
+    ids = pd.concat([both.loc[changed, KEY + "_prev"], both.loc[changed, KEY]]).dropna()
+    return set(ids.astype(str))
+
+
+def load_agg_state(state_path: str, repo_level_path: str) -> Optional[tuple[pd.DataFrame, pd.DataFrame]]:
+    state_cols, repo_cols = state_path, cols_path(repo_level_path)
+    if not (os.path.isdir(state_cols) and os.path.isdir(repo_cols)):
+        return None
+    if read_manifest(state_cols).get("meta", {}).get("version") != AGG_VERSION:
+        return None
+    prev_fp = read_frame(state_cols, mmap=False)
+    prev_repo = read_frame(repo_cols, mmap=False)
+    # repo-level tablica mora odgovarati stanju, inače je mijenjana izvan 04_integrate.py
+    if KEY not in prev_repo.columns or set(prev_repo[KEY].astype(str)) != set(prev_fp[KEY]):
+        return None
+    return prev_fp, prev_repo
+
+
+def save_agg_state(state_path: str, fp: pd.DataFrame) -> None:
+    write_frame(fp, state_path, meta={"version": AGG_VERSION})
+
+
+def update_repo_level(
+    merged: pd.DataFrame,
+    prev: Optional[tuple[pd.DataFrame, pd.DataFrame]] = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, Optional[set[str]]]:
+    # vraća (repo-level, otiske redaka, ponovno izračunate repoe); None znači puni izračun
+    cur_fp = row_fingerprints(merged)
+    if prev is None:
+        return aggregate_repos(merged), cur_fp, None
+
+    prev_fp, prev_repo = prev
+    touched = touched_repos(prev_fp, cur_fp)
+    if not touched:
+        return prev_repo, cur_fp, touched
+
+    fresh = aggregate_repos(merged[merged[KEY].astype(str).isin(touched)])
+    kept = prev_repo[~prev_repo[KEY].astype(str).isin(touched)]
+    if fresh.empty:
+        repo_level = kept
+    else:
+        # zadržani retci dobivaju tipove svježe agregacije, tj. iste kao kod punog izračuna
+        kept = kept.astype({c: fresh[c].dtype for c in fresh.columns if c in kept.columns}, errors="ignore")
+        repo_level = pd.concat([kept, fresh], ignore_index=True) if len(kept) else fresh
+    order = np.argsort(repo_level[KEY].astype(str).to_numpy(), kind="stable")
+    return repo_level.iloc[order].reset_index(drop=True), cur_fp, touched
@@ -0,0 +1,57 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Gotovi odgovori API-ja po (ruta, normalizirani parametri, verzija baze). Verzija je dio ključa,
+# pa nova baza sama po sebi promaši stare unose; LRU ih s vremenom izbaci.
+
+
+def strong_etag(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(path: str, args: list[tuple[str, str]], version: str) -> tuple:
+        # redoslijed parametara u URL-u ne mijenja odgovor
+        return path, tuple(sorted(args)), version
+
+    def get(self, key: tuple) -> Optional[tuple[int, str, bytes, str, tuple]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: tuple, status: int, mimetype: str, body: bytes, headers: tuple = ()) -> str:
+        etag = strong_etag(body)
+        if len(body) > self.max_bytes:
+            return etag
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._items[key] = (status, mimetype, body, etag, headers)
+            self._bytes += len(body)
+            while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted[2])
+        return etag
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
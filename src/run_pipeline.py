@@ -0,0 +1,386 @@
+import argparse
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SRC_DIR)
+STATE_PATH = "data/.pipeline_state.json"
+
+RAW_CSV = "data/raw/llm_comparison_dataset.csv"
+CANDIDATES_JSON = "data/raw/hf_candidates_by_row.json"
+HF_CACHE = "data/raw/hf_metrics_by_repo.json"
+HF_CACHE_DB = "data/raw/hf_metrics_cache.sqlite"
+SNAPSHOT = "data/raw/hf_catalogue_snapshot.json.gz"
+KAGGLE_CLEAN = "data/processed/kaggle_clean"
+MAP_CSV = "data/processed/kaggle_to_hf_map.csv"
+MERGED = "data/processed/merged_llm_data"
+REPO_LEVEL = "data/processed/merged_llm_data_repo_level"
+AGG_STATE = "data/processed/repo_agg_state.cols"
+NORMALIZED = "data/processed/merged_llm_data_repo_level_normalized"
+REPO_STATS = "data/processed/repo_level_stats.json"
+DB_PATH = "data/processed/llm_context.db"
+FIGURES = "reports/figures/*.png"
+
+
+def table(name: str, columns: Optional[list[str]] = None) -> list[str]:
+    # CSV izvoz i binarna stupčana kopija (columnar.py) su isti međurezultat; s popisom stupaca
+    # faza ovisi samo o tim stupcima ("<csv>#a,b")
+    if columns:
+        return [name + ".csv#" + ",".join(columns)]
+    return [name + ".csv", name + ".cols"]
+
+
+def option_value(args: list[str], flag: str, const: str) -> Optional[str]:
+    # vrijednost opcije s nargs="?" (kao argparse u 03 i 04): "--flag", "--flag putanja" ili "--flag=putanja"
+    for i, a in enumerate(args):
+        if a.startswith(flag + "="):
+            return a.split("=", 1)[1]
+        if a == flag:
+            nxt = args[i + 1] if i + 1 < len(args) else None
+            return nxt if nxt and not nxt.startswith("-") else const
+    return None
+
+
+def hf_files(args: list[str], metrics: bool = False) -> tuple[list[str], list[str]]:
+    # HF izvori ovise o argumentima faze: snapshot kataloga uz --snapshot ili --matcher, a bez --snapshot
+    # 04 metrike čita i osvježava u SQLite cacheu
+    snapshot = option_value(args, "--snapshot", SNAPSHOT)
+    inputs, outputs = [], []
+    if snapshot or "--matcher" in args:
+        inputs.append(snapshot or SNAPSHOT)
+    if metrics and not snapshot:
+        inputs.append(HF_CACHE_DB)
+        outputs.append(HF_CACHE_DB)
+    return inputs, outputs
+
+
+# ulazi i izlazi su putanje relativne na korijen projekta; smiju sadržavati glob. "args_files" dodaje
+# ulaze i izlaze koji ovise o argumentima faze (--stage-args)
+STAGES = [
+    {"name": "01", "script": "01_check_kaggle_csv.py", "inputs": [RAW_CSV], "outputs": []},
+    {"name": "02", "script": "02_clean_kaggle.py", "inputs": [RAW_CSV], "outputs": table(KAGGLE_CLEAN)},
+    {"name": "03", "script": "03_fetch_hf_candidates.py", "inputs": table(KAGGLE_CLEAN, ["kaggle_row_id", "model_name", "provider"]),
+     "outputs": [CANDIDATES_JSON], "args_files": hf_files},
+    {
+        "name": "04",
+        "script": "04_integrate.py",
+        "inputs": table(KAGGLE_CLEAN) + [CANDIDATES_JSON, HF_CACHE],
+        "outputs": [MAP_CSV, HF_CACHE, AGG_STATE] + table(MERGED) + table(REPO_LEVEL),
+        "args_files": lambda args: hf_files(args, metrics=True),
+    },
+    {
+        "name": "05",
+        "script": "05_analyze_visualize.py",
+        "inputs": table(MERGED) + table(REPO_LEVEL),
+        "outputs": table(NORMALIZED) + [REPO_STATS, FIGURES],
+    },
+    {"name": "06", "script": "06_store_db.py", "inputs": table(MERGED) + table(REPO_LEVEL), "outputs": [DB_PATH]},
+]
+API_SCRIPT = "07_api.py"
+
+
+class Fingerprints:
+    # sha256 sadržaja s cacheom po (size, mtime_ns), pa ponovljeno pokretanje bez promjena samo radi stat()
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def file(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = [st.st_size, st.st_mtime_ns]
+        hit = self.cache.get(path)
+        if hit and hit[:2] == key:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[path] = key + [digest]
+        return digest
+
+    def columns(self, entry: str) -> Optional[str]:
+        csv_path, names = entry.split("#", 1)
+        # columnar.py se ne uvozi jer bi import pandasa bio sporiji od cijelog praznog prolaza
+        path = os.path.splitext(csv_path)[0] + ".cols"
+        manifest = os.path.join(path, "manifest.json")
+        # isti izbor kao columnar.read_table: binarna kopija samo ako nije starija od CSV-a
+        if not os.path.exists(manifest) or (
+            os.path.exists(csv_path) and os.path.getmtime(manifest) < os.path.getmtime(csv_path)
+        ):
+            return self.file(csv_path)
+        with open(manifest, "r", encoding="utf-8") as f:
+            specs = {c["name"]: c for c in json.load(f)["columns"]}
+        h = hashlib.sha256()
+        for name in names.split(","):
+            spec = specs.get(name)
+            h.update(json.dumps(spec, sort_keys=True).encode())
+            if spec:
+                for suffix in ("", ".mask"):
+                    h.update(str(self.file(os.path.join(path, spec["file"] + suffix))).encode())
+        return h.hexdigest()
+
+    def path(self, pattern: str) -> dict[str, Optional[str]]:
+        if "#" in pattern:
+            return {pattern: self.columns(pattern)}
+        paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        out = {}
+        for p in paths:
+            if os.path.isdir(p):
+                for dirpath, dirnames, filenames in os.walk(p):
+                    dirnames.sort()
+                    for fn in sorted(filenames):
+                        fp = os.path.join(dirpath, fn)
+                        out[fp] = self.file(fp)
+            else:
+                out[p] = self.file(p)
+        return out
+
+    def paths(self, patterns: list[str]) -> dict[str, Optional[str]]:
+        out = {}
+        for p in patterns:
+            out.update(self.path(p))
+        return out
+
+
+def local_modules(script: str) -> list[str]:
+    # skripta + pomoćni moduli iz src/ koje (tranzitivno) uvozi; promjena bilo kojeg od njih mijenja kod faze
+    seen = []
+    todo = [os.path.join(SRC_DIR, script)]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        with open(path, "r", encoding="utf-8") as f:
+            src = f.read()
+        for mod in re.findall(r"^\s*(?:from|import)\s+(\w+)", src, flags=re.M):
+            dep = os.path.join(SRC_DIR, mod + ".py")
+            if os.path.exists(dep):
+                todo.append(dep)
+    return sorted(os.path.relpath(p, ROOT) for p in seen)
+
+
+def stage_files(stage: dict, extra_args: list[str]) -> tuple[list[str], list[str]]:
+    inputs, outputs = stage.get("args_files", lambda args: ([], []))(extra_args)
+    return stage["inputs"] + inputs, stage["outputs"] + outputs
+
+
+def stage_key(stage: dict, fp: Fingerprints, extra_args: list[str]) -> str:
+    h = hashlib.sha256()
+    inputs, _ = stage_files(stage, extra_args)
+    for kind, entries in (("code", fp.paths(local_modules(stage["script"]))), ("input", fp.paths(inputs))):
+        for path, digest in sorted(entries.items()):
+            h.update(f"{kind}\0{path}\0{digest}\n".encode())
+    h.update(json.dumps(extra_args).encode())
+    return h.hexdigest()
+
+
+def dependencies(stages: list[dict]) -> dict[str, set[str]]:
+    # faza ovisi o svakoj fazi čiji izlaz čita; vlastiti izlaz (npr. HF cache u 04) ne stvara ovisnost
+    producers = {}
+    for st in stages:
+        for out in st["outputs"]:
+            producers[out] = st["name"]
+    return {
+        st["name"]: {
+            producers[base] for base in (i.split("#", 1)[0] for i in st["inputs"])
+            if base in producers and producers[base] != st["name"]
+        }
+        for st in stages
+    }
+
+
+def load_state(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"files": {}, "stages": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_current(stage: dict, key: str, state: dict, fp: Fingerprints, extra_args: list[str]) -> bool:
+    prev = state["stages"].get(stage["name"])
+    if not prev or prev["key"] != key:
+        return False
+    # izlazi obrisani ili ručno mijenjani nakon zadnjeg pokretanja
+    return fp.paths(stage_files(stage, extra_args)[1]) == prev["outputs"]
+
+
+def run_stage(stage: dict, extra_args: list[str]) -> tuple[int, str, float]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, stage["script"])] + extra_args,
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    return proc.returncode, proc.stdout, time.perf_counter() - t0
+
+
+def load_stage(script: str):
+    # numerirane skripte nisu ispravna imena modula, pa se učitavaju po putanji
+    name = "stage_" + os.path.splitext(script)[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SRC_DIR, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_in_process(args) -> int:
+    # 02 -> 04 -> 05 -> 06 u jednom procesu: DataFrameovi se predaju izravno, bez zapisivanja i ponovnog čitanja
+    t0 = time.perf_counter()
+    clean_mod, integrate_mod, analyze_mod, store_mod = (
+        load_stage(st["script"]) for st in STAGES if st["name"] in ("02", "04", "05", "06")
+    )
+    from columnar import write_table
+
+    timings = [("import", time.perf_counter() - t0)]
+    opts = integrate_mod.parse_args(shlex.split(dict(args.stage_args).get("04", "")))
+
+    def step(label, fn):
+        t = time.perf_counter()
+        out = fn()
+        timings.append((label, time.perf_counter() - t))
+        return out
+
+    df = step("clean", clean_mod.clean)
+    cand_by_row = step("candidates", lambda: integrate_mod.load_candidates(df, matcher=opts.matcher, snapshot=opts.snapshot))
+    # stanje inkrementalne agregacije ima smisla samo ako se repo-level tablica i zapisuje
+    agg_state = None
+    if args.write_intermediates and not opts.full_aggregate:
+        agg_state = integrate_mod.load_agg_state(integrate_mod.AGG_STATE, REPO_LEVEL + ".csv")
+    mp, merged, repo_level, fingerprints = step("integrate", lambda: integrate_mod.integrate(
+        df, cand_by_row,
+        metrics_for=lambda ids: integrate_mod.load_metrics(ids, snapshot=opts.snapshot, ttl_hours=opts.ttl_hours),
+        vectorized=not opts.serial_mapping,
+        agg_state=agg_state,
+    ))
+    if args.write_intermediates:
+        def write_intermediates():
+            write_table(df, KAGGLE_CLEAN + ".csv", csv=not opts.no_csv)
+            mp.to_csv(MAP_CSV, index=False, encoding="utf-8-sig")
+            write_table(merged, MERGED + ".csv", csv=not opts.no_csv)
+            write_table(repo_level, REPO_LEVEL + ".csv", csv=not opts.no_csv)
+            integrate_mod.save_agg_state(integrate_mod.AGG_STATE, fingerprints)
+        step("intermediates", write_intermediates)
+
+    repo_norm = step("analyze", lambda: analyze_mod.analyze(merged, repo_level))
+    step("normalized", lambda: write_table(repo_norm, NORMALIZED + ".csv"))
+    step("store", lambda: store_mod.store(merged, repo_level, DB_PATH))
+
+    for label, secs in timings:
+        print(f"  {label:<14} {secs:6.2f}s")
+    print(f"Redaka: kaggle_clean={len(df)} merged={len(merged)} repo-level={len(repo_level)}")
+    return 0
+
+
+def run_pipeline(args) -> int:
+    state = load_state(args.state)
+    fp = Fingerprints(state["files"])
+    stages = [st for st in STAGES if not args.only or st["name"] in args.only]
+    deps = dependencies(stages)
+    stage_args = {name: shlex.split(a) for name, a in args.stage_args}
+
+    pending = {st["name"]: st for st in stages}
+    done, failed, dirty = set(), set(), set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while pending or running:
+            for name, st in list(pending.items()):
+                if deps[name] & failed:
+                    print(f"[{name}] preskočeno: ovisnost nije uspjela")
+                    failed.add(name)
+                    del pending[name]
+                    continue
+                if not deps[name] <= done:
+                    continue
+                del pending[name]
+                extra = stage_args.get(name, [])
+                # ključ se računa tek kad su ovisnosti gotove, pa vidi njihove nove izlaze
+                key = stage_key(st, fp, extra)
+                if not args.force and not deps[name] & dirty and is_current(st, key, state, fp, extra):
+                    print(f"[{name}] nepromijenjeno, preskačem")
+                    done.add(name)
+                elif args.dry_run:
+                    print(f"[{name}] bi se pokrenulo: {st['script']}")
+                    done.add(name)
+                    dirty.add(name)
+                else:
+                    print(f"[{name}] pokrećem {st['script']}")
+                    running[pool.submit(run_stage, st, extra)] = (st, extra)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                st, extra = running.pop(fut)
+                code, output, secs = fut.result()
+                for line in output.rstrip().splitlines():
+                    print(f"[{st['name']}] {line}")
+                if code != 0:
+                    print(f"[{st['name']}] NEUSPJEH (exit {code}) nakon {secs:.1f}s")
+                    failed.add(st["name"])
+                    state["stages"].pop(st["name"], None)
+                    continue
+                print(f"[{st['name']}] gotovo za {secs:.1f}s")
+                done.add(st["name"])
+                # ulazi se ponovno hashiraju nakon pokretanja jer faza može osvježiti i vlastiti ulaz (HF cache)
+                state["stages"][st["name"]] = {"key": stage_key(st, fp, extra), "outputs": fp.paths(stage_files(st, extra)[1])}
+            save_state(args.state, state)
+
+    # zastarjeli unosi za datoteke koje više ne postoje
+    state["files"] = {p: v for p, v in state["files"].items() if os.path.exists(p)}
+    if not args.dry_run:
+        save_state(args.state, state)
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Inkrementalno pokretanje pipelinea 01-06: faza se preskače ako su joj ulazi i kod nepromijenjeni."
+    )
+    ap.add_argument("--only", nargs="+", metavar="FAZA", help="pokreni samo navedene faze (npr. 05 06)")
+    ap.add_argument("--force", action="store_true", help="pokreni faze bez obzira na otiske")
+    ap.add_argument("--dry-run", action="store_true", help="samo ispiši koje bi se faze pokrenule")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="najviše paralelnih faza")
+    ap.add_argument("--stage-args", action="append", default=[], metavar="FAZA=ARGUMENTI",
+                    type=lambda s: tuple(s.split("=", 1)),
+                    help='dodatni argumenti za fazu, npr. --stage-args "03=--snapshot"; ulaze u otisak faze')
+    ap.add_argument("--in-process", action="store_true",
+                    help="izvedi 02, 04, 05 i 06 u jednom procesu bez međurezultata na disku (03 se ne pokreće)")
+    ap.add_argument("--write-intermediates", action="store_true",
+                    help="uz --in-process zapiši i međurezultate (kaggle_clean, mapu, row- i repo-level)")
+    ap.add_argument("--serve", action="store_true", help=f"nakon uspješnog pipelinea pokreni {API_SCRIPT}")
+    ap.add_argument("--state", default=STATE_PATH)
+    args = ap.parse_args()
+
+    os.chdir(ROOT)
+    t0 = time.perf_counter()
+    code = run_in_process(args) if args.in_process else run_pipeline(args)
+    print(f"Pipeline završen za {time.perf_counter() - t0:.2f}s")
+    if code:
+        sys.exit(code)
+    if args.serve:
+        os.execv(sys.executable, [sys.executable, os.path.join(SRC_DIR, API_SCRIPT)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+RENAME_MAP = {
+    "Model": "model_name",
+    "Provider": "provider",
+    "Context Window": "context_window",
+    "Speed (tokens/sec)": "speed_tokens_per_sec",
+    "Latency (sec)": "latency_sec",
+    "Benchmark (MMLU)": "benchmark_mmlu",
+    "Benchmark (Chatbot Arena)": "benchmark_chatbot_arena",
+    "Open-Source": "open_source",
+    "Price / Million Tokens": "price_per_million_tokens",
+    "Training Dataset Size": "training_dataset_size",
+    "Compute Power": "compute_power",
+    "Energy Efficiency": "energy_efficiency",
+    "Quality Rating": "quality_rating",
+    "Speed Rating": "speed_rating",
+    "Price Rating": "price_rating",
+}
+
+NUM_COLS = [
+    "context_window", "speed_tokens_per_sec", "latency_sec",
+    "benchmark_mmlu", "benchmark_chatbot_arena",
+    "price_per_million_tokens", "training_dataset_size",
+    "compute_power", "energy_efficiency",
+    "quality_rating", "speed_rating", "price_rating",
+]
+
+FLOAT_COLS = ["latency_sec", "price_per_million_tokens", "energy_efficiency"]
+
+# 0/1 oznake; nisu mjere za analizu, ali se čiste kao cjelobrojni stupci
+FLAG_COLS = ["open_source"]
+
+# ciljni tipovi očišćenog Kaggle skupa; cjelobrojni stupci su nullable kako bi NaN u jednom
+# chunku ne bi prebacio stupac u float i promijenio zapis u CSV-u
+CLEAN_DTYPES = {
+    "kaggle_row_id": "int64",
+    "model_name": "object",
+    "provider": "object",
+    **{c: ("float64" if c in FLOAT_COLS else "Int64") for c in NUM_COLS},
+    **{c: "Int64" for c in FLAG_COLS},
+}
+
+# sirovi numerički stupci čitaju se kao tekst, pa neispravne vrijednosti postaju NaN kroz to_numeric
+RAW_DTYPES = {
+    raw: "str" for raw, col in RENAME_MAP.items()
+    if col in NUM_COLS or col in FLAG_COLS or col in ("model_name", "provider")
+}
+
+CATEGORY_COLS = ["model_name", "provider", "hf_repo_id", "hf_status"]
+
+# najmanji cjelobrojni tip za svaki stupac; ako vrijednosti ne stanu, compact_frame koristi Int64
+INT_DTYPES = {
+    "kaggle_row_id": "Int32",
+    "n_kaggle_rows": "Int32",
+    "context_window": "Int32",
+    "speed_tokens_per_sec": "Int32",
+    "benchmark_mmlu": "Int16",
+    "benchmark_chatbot_arena": "Int16",
+    "compute_power": "Int16",
+    "training_dataset_size": "Int64",
+    "open_source": "Int8",
+    "quality_rating": "Int8",
+    "speed_rating": "Int8",
+    "price_rating": "Int8",
+    "hf_likes": "Int32",
+    "hf_downloads": "Int64",
+    "hf_downloads_all_time": "Int64",
+}
+
+FLOAT32_COLS = [
+    "latency_sec", "price_per_million_tokens", "energy_efficiency",
+    "speed_tokens_per_sec", "benchmark_mmlu", "benchmark_chatbot_arena",
+]
+
+
+def _fits(s: pd.Series, dtype: str) -> bool:
+    vals = s.dropna()
+    if len(vals) == 0:
+        return True
+    info = np.iinfo(dtype.lower())
+    return info.min <= vals.min() and vals.max() <= info.max
+
+
+def compact_frame(df: pd.DataFrame, float32: bool = False) -> pd.DataFrame:
+    df = df.copy()
+    for c in df.columns:
+        s = df[c]
+        if c in CATEGORY_COLS:
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                df[c] = s.astype("category")
+        elif c in INT_DTYPES and pd.api.types.is_integer_dtype(s):
+            # sužavaju se samo stupci koji su već cjelobrojni; medijani i sl. ostaju float
+            df[c] = s.astype(INT_DTYPES[c] if _fits(s, INT_DTYPES[c]) else "Int64")
+        elif float32 and c in FLOAT32_COLS and pd.api.types.is_float_dtype(s):
+            # float32 samo za frameove koji se ne zapisuju natrag (grafovi); inače se gube znamenke u CSV-u i bazi
+            df[c] = s.astype("float32")
+    return df
+
+
+def memory_report(label: str, df: pd.DataFrame, before: Optional[int] = None) -> int:
+    after = int(df.memory_usage(deep=True).sum())
+    msg = f"Memory {label}: {after / 2**20:.2f} MB"
+    if before:
+        msg += f" (bilo {before / 2**20:.2f} MB, {before / max(after, 1):.1f}x manje)"
+    print(msg)
+    return after
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog:
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, values) -> None:
+        values = pd.Series(values).dropna()
+        if len(values):
+            self.add_hashes(pd.util.hash_array(values.astype(str).to_numpy(dtype=object)))
+
+    def add_hashes(self, h: np.ndarray) -> None:
+        h = np.asarray(h, dtype=np.uint64)
+        idx = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        # rang = pozicija prvog postavljenog bita u preostalih 64-p bitova; sentinel bit ograničava rang
+        w = (h << np.uint64(self.p)) | np.uint64(1 << (self.p - 1))
+        hi = (w >> np.uint64(32)).astype(np.float64)
+        lo = (w & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        bitlen = np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+        rank = (65 - bitlen).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError("HyperLogLog skice moraju imati isti p.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        est = alpha * self.m * self.m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if est <= 2.5 * self.m and zeros:
+            # linear counting je točniji za mali broj različitih vrijednosti
+            est = self.m * np.log(self.m / zeros)
+        return int(round(est))
+
+
+class CoMoments:
+    # jednoprolazni momenti za k stupaca: za svaki par (i, j) broj redaka u kojima su oba prisutna,
+    # srednja vrijednost i M2 stupca i na tim recima te ko-moment; dijagonala su obični mean/M2 stupca
+    def __init__(self, columns: list[str]):
+        k = len(columns)
+        self.columns = list(columns)
+        self.n = np.zeros((k, k), dtype=np.int64)
+        self.mean = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.c = np.zeros((k, k))
+
+    def update(self, values) -> "CoMoments":
+        x = np.asarray(values, dtype=np.float64).reshape(-1, len(self.columns))
+        if len(x):
+            self.merge(self._from_chunk(x))
+        return self
+
+    def _from_chunk(self, x: np.ndarray) -> "CoMoments":
+        # momenti jednog chunka dvoprolazno (pomak za srednju vrijednost stupca), pa spajanje kao za dvije particije
+        present = ~np.isnan(x)
+        m = present.astype(np.float64)
+        n = m.T @ m
+        k = x.shape[1]
+        shift, m2_col = np.zeros(k), np.zeros(k)
+        for i in range(k):
+            col = x[present[:, i], i]
+            if len(col):
+                # dijagonala dvoprolazno kao Series.mean/std, ali ne istim redoslijedom zbrajanja, pa se i za
+                # jedan chunk std (i Z-score) od pandasova može razlikovati na razini zaokruživanja (~1e-16)
+                shift[i] = col.mean()
+                m2_col[i] = ((col - shift[i]) ** 2).sum()
+        xs = np.where(present, x - shift, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_s = np.where(n > 0, (xs.T @ m) / n, 0.0)
+        out = CoMoments(self.columns)
+        out.n = n.astype(np.int64)
+        out.mean = np.where(n > 0, mean_s + shift[:, None], 0.0)
+        out.m2 = np.maximum((xs ** 2).T @ m - n * mean_s ** 2, 0.0)
+        out.c = xs.T @ xs - n * mean_s * mean_s.T
+        diag = np.arange(k)
+        out.mean[diag, diag] = shift
+        out.m2[diag, diag] = m2_col
+        out.c[diag, diag] = m2_col
+        return out
+
+    def merge(self, other: "CoMoments") -> "CoMoments":
+        # Chanova formula za spajanje dviju particija; redoslijed spajanja ne mijenja rezultat (do zaokruživanja)
+        if other.columns != self.columns:
+            raise ValueError("CoMoments skice moraju imati iste stupce.")
+        na, nb = self.n.astype(np.float64), other.n.astype(np.float64)
+        n = na + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            w = np.where(n > 0, na * nb / n, 0.0)
+            frac = np.where(n > 0, nb / n, 0.0)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * frac
+        self.m2 = self.m2 + other.m2 + delta ** 2 * w
+        self.c = self.c + other.c + delta * delta.T * w
+        self.n = self.n + other.n
+        return self
+
+    def _index(self, column: str) -> int:
+        return self.columns.index(column)
+
+    def count(self, column: str) -> int:
+        i = self._index(column)
+        return int(self.n[i, i])
+
+    def column_mean(self, column: str) -> float:
+        i = self._index(column)
+        return float(self.mean[i, i]) if self.n[i, i] else float("nan")
+
+    def column_std(self, column: str, ddof: int = 0) -> float:
+        i = self._index(column)
+        dof = self.n[i, i] - ddof
+        return float(np.sqrt(self.m2[i, i] / dof)) if dof > 0 else float("nan")
+
+    def corr(self) -> np.ndarray:
+        # Pearson po parovima prisutnih vrijednosti (kao DataFrame.corr), bez odbacivanja cijelih redaka
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = np.clip(self.c / np.sqrt(self.m2 * self.m2.T), -1.0, 1.0)
+        diag = np.arange(len(self.columns))
+        r[diag, diag] = np.where(np.diag(self.m2) > 0, 1.0, np.nan)
+        r[self.n < 2] = np.nan
+        return r
+
+    def to_dict(self) -> dict:
+        return {
+            "columns": self.columns,
+            "n": self.n.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "c": self.c.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "CoMoments":
+        out = cls(d["columns"])
+        k = len(out.columns)
+        out.n = np.array(d["n"], dtype=np.int64).reshape(k, k)
+        out.mean = np.array(d["mean"], dtype=np.float64).reshape(k, k)
+        out.m2 = np.array(d["m2"], dtype=np.float64).reshape(k, k)
+        out.c = np.array(d["c"], dtype=np.float64).reshape(k, k)
+        return out